@@ -1,60 +1,114 @@
 """
 API routes for the LEBENGOOD application
 """
-from fastapi import APIRouter, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Depends, HTTPException
+from fastapi import APIRouter, UploadFile, File, Form, WebSocket, WebSocketDisconnect, Depends, HTTPException, Query, status
 from fastapi.responses import JSONResponse
 from typing import List, Optional
 import json
 import asyncio
-import tempfile
+import os
 import shutil
-import zipfile
 import io
 from pathlib import Path
 
-from services.google_drive import GoogleDriveService
-from services.file_processor import FileProcessor
-from auth import security
+from services.google_drive import GoogleDriveService, RUTA_FOTOS_ORDENADAS
+from services.file_processor import FileProcessor, PERFILES_JPEG, PERFIL_JPEG_POR_DEFECTO
+from services.photo_gatherer import PhotoGatherer
+from services.rename_pipeline import RenamePipeline
+from services.image_preflight import inspeccionar_lote
+from services.job_manager import job_manager
+from services.ws_manager import ws_manager, canales_actuales, canal_usuario, canal_job
+from services.log_bridge import LogBridge
+from auth import security, models, database
 from utils.helpers import (
-    es_imagen, extraer_pais_de_ruta, extraer_color_de_nombre,
-    transformar_nombre_carpeta, validar_formato_pt
+    extraer_pais_de_ruta, extraer_color_de_nombre, transformar_nombre_carpeta
 )
+from utils.filename_rules import clasificar_nombres, NO_IMAGEN, OMITIDO
 from utils.exceptions import (
     ValidationError, AuthenticationError, DriveServiceError,
     FileProcessingError, FolderNotFoundError
 )
 
-# Protect all routes in this router
-router = APIRouter(dependencies=[Depends(security.get_current_active_user)])
+async def canal_del_usuario(current_user: models.User = Depends(security.get_current_active_user)):
+    """Send the WebSocket messages logged while serving this request to its user only"""
+    canales_actuales.set((canal_usuario(current_user.username),))
+    return current_user
+
+
+# Protect all routes in this router; their progress goes to the calling user's channel
+router = APIRouter(dependencies=[Depends(canal_del_usuario)])
 ws_router = APIRouter()
 
 # Global drive service instance
 drive_service = None
 
-# WebSocket connections
-active_connections: List[WebSocket] = []
+# Block size used to stream uploaded files into the staging folder
+UPLOAD_COPY_CHUNK_SIZE = int(os.getenv('UPLOAD_COPY_CHUNK_SIZE', str(1024 * 1024)))
 
 
 async def broadcast_message(message: str):
-    """Broadcast message to all connected WebSocket clients"""
-    for connection in active_connections:
-        try:
-            await connection.send_text(message)
-        except:
-            pass
+    """Queue a message for the WebSocket clients of the current request's or job's channels"""
+    ws_manager.difundir(message)
+
+
+def puede_ver_job(job: dict, user: models.User) -> bool:
+    """Jobs are visible to the user that started them and to admins"""
+    return job['user'] in (None, user.username) or user.role == "admin"
+
+
+def guardar_upload(upload: UploadFile, destino: Path) -> int:
+    """
+    Stream an uploaded file to disk block by block, so memory use does not depend on
+    the file size. Blocking; run it in a worker thread. Returns the bytes written.
+    """
+    upload.file.seek(0)
+    with open(destino, 'wb') as salida:
+        shutil.copyfileobj(upload.file, salida, UPLOAD_COPY_CHUNK_SIZE)
+        return salida.tell()
+
+
+def respuesta_job(job: dict) -> JSONResponse:
+    """202 response for a request queued as a background job"""
+    return JSONResponse(status_code=202, content={
+        "success": True,
+        "job_id": job['id'],
+        "status": job['status'],
+        "status_url": f"/api/jobs/{job['id']}"
+    })
 
 
 @ws_router.websocket("/ws")
-async def websocket_endpoint(websocket: WebSocket):
-    """WebSocket endpoint for real-time logging"""
-    await websocket.accept()
-    active_connections.append(websocket)
+async def websocket_endpoint(websocket: WebSocket, token: str = Query(default=None), job: str = Query(default=None)):
+    """
+    WebSocket endpoint for real-time logging. Authenticated with the JWT in ?token=;
+    receives the user's own traffic, plus that of one background job with ?job=.
+    """
+    db = database.SessionLocal()
+    try:
+        user = security.get_user_from_token(token, db) if token else None
+    finally:
+        db.close()
+    if user is None:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    canales = [canal_usuario(user.username)]
+    if job:
+        estado_job = job_manager.obtener(job)
+        if estado_job is None or not puede_ver_job(estado_job, user):
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        canales.append(canal_job(job))
+    
+    await ws_manager.conectar(websocket, canales)
     try:
         while True:
             # Keep connection alive
             await websocket.receive_text()
     except WebSocketDisconnect:
-        active_connections.remove(websocket)
+        pass
+    finally:
+        await ws_manager.desconectar(websocket)
 
 
 @router.get("/auth/status")
@@ -130,43 +184,38 @@ async def preview_rename(
             valid_files = []
             invalid_files = []
             png_count = 0
+            candidatos = []
             
-            for file in files:
-                file_name = file.filename.split('/')[-1] if '/' in file.filename else file.filename
-                
-                # Skip system files and hidden files
-                system_files = {'.DS_Store', 'Thumbs.db', 'desktop.ini', '.localized'}
-                if file_name in system_files or file_name.startswith('._') or file_name.startswith('.'):
+            # Classify every file name of the folder in one pass; system and hidden files are skipped
+            veredictos = clasificar_nombres(file.filename.split('/')[-1] for file in files)
+            for file, veredicto in zip(files, veredictos):
+                if veredicto.estado == OMITIDO:
                     continue
                 
-                # Check if it's an image
-                if not es_imagen(file_name):
+                if not veredicto.valido:
                     invalid_files.append({
-                        "name": file_name,
-                        "reason": "No es un archivo de imagen"
+                        "name": veredicto.nombre,
+                        "reason": veredicto.motivo
                     })
                     continue
                 
-                # Check .PT format
-                if not validar_formato_pt(file_name):
-                    invalid_files.append({
-                        "name": file_name,
-                        "reason": "Formato .PT incorrecto (debe tener exactamente 2 dígitos, ej: .PT01)"
-                    })
-                    continue
-                
-                # Check for .PT or .MAIN
-                file_upper = file_name.upper()
-                if '.PT' not in file_upper and '.MAIN' not in file_upper:
+                candidatos.append((veredicto, file))
+            
+            # Header-only preflight of the well-named images, in parallel
+            images = await asyncio.to_thread(
+                inspeccionar_lote, [(veredicto.nombre, file.file) for veredicto, file in candidatos]
+            )
+            for (veredicto, _), reporte in zip(candidatos, images):
+                if not reporte['ok']:
                     invalid_files.append({
-                        "name": file_name,
-                        "reason": "Debe contener .PT o .MAIN en el nombre"
+                        "name": veredicto.nombre,
+                        "reason": reporte['error']
                     })
                     continue
                 
                 # File is valid
-                valid_files.append(file_name)
-                if file_name.lower().endswith('.png'):
+                valid_files.append(veredicto.nombre)
+                if veredicto.es_png:
                     png_count += 1
             
             folder_analyses.append({
@@ -177,6 +226,7 @@ async def preview_rename(
                     "valid": valid_files,
                     "invalid": invalid_files
                 },
+                "images": images,
                 "stats": {
                     "total": len(files),
                     "valid": len(valid_files),
@@ -219,16 +269,19 @@ async def process_rename(
     articulo: str = Form(...),
     codigos: str = Form(...),
     folders: List[UploadFile] = File(...),
-    only_images: str = Form(default="false")
+    only_images: str = Form(default="false"),
+    server_copy: str = Form(default="false"),
+    jpeg_profile: str = Form(default=PERFIL_JPEG_POR_DEFECTO),
+    background: str = Form(default="false"),
+    current_user: models.User = Depends(canal_del_usuario)
 ):
-    """Process file renaming with folder uploads"""
-    global drive_service
-    
+    """
+    Process file renaming with folder uploads. With background, the batch is persisted
+    and queued as a job, and the response carries its ID for GET /jobs/{job_id}.
+    """
     try:
-        if not drive_service:
-            drive_service = GoogleDriveService()
-        
         only_images_flag = only_images.lower() == "true"
+        server_copy_flag = server_copy.lower() == "true"
         
         if only_images_flag:
             await broadcast_message("🚀 Iniciando procesamiento (solo fotos)...")
@@ -245,6 +298,12 @@ async def process_rename(
             await broadcast_message(f"❌ {error_msg}")
             raise ValidationError(error_msg, {"invalid_codes": codigos_invalidos})
         
+        perfil_jpeg = jpeg_profile.strip().lower()
+        if perfil_jpeg not in PERFILES_JPEG:
+            error_msg = f"Perfil JPEG inválido: {jpeg_profile} (válidos: {', '.join(PERFILES_JPEG)})"
+            await broadcast_message(f"❌ {error_msg}")
+            raise ValidationError(error_msg, {"valid_profiles": list(PERFILES_JPEG)})
+        
         articulo_upper = articulo.upper().strip()
         
         # Group files by folder based on their relative path
@@ -263,81 +322,145 @@ async def process_rename(
         if not folders_dict:
             raise ValidationError("No se encontraron carpetas válidas para procesar")
         
-        results = []
         total_carpetas = len(folders_dict)
         
-        await broadcast_message(f"\n📦 Procesando {total_carpetas} carpetas...")
-        
-        # Process each folder
-        for i, (folder_name, files) in enumerate(folders_dict.items(), 1):
-            await broadcast_message(f"\n📁 [{i}/{total_carpetas}] Procesando: {folder_name}")
+        if background.lower() == "true":
+            job = job_manager.crear('rename', folders_dict, {
+                "articulo": articulo_upper,
+                "codigos": lista_codigos,
+                "only_images": only_images_flag,
+                "server_copy": server_copy_flag,
+                "jpeg_profile": perfil_jpeg
+            }, current_user.username, persistir=False)
             
+            # Uploaded files only live as long as this request: persist the batch before answering.
+            # The job only reaches the journal, and can only be resumed, once all of it is saved.
             try:
-                # Create temp directory for this folder
-                with tempfile.TemporaryDirectory() as temp_dir:
-                    folder_path = Path(temp_dir) / folder_name
-                    folder_path.mkdir(parents=True, exist_ok=True)
-                    
-                    # Save all files to temp folder
-                    files_saved = 0
-                    files_skipped = 0
-                    
-                    for file in files:
-                        # Get the relative path and recreate structure
-                        rel_path = file.filename
-                        file_name = rel_path.split('/')[-1] if '/' in rel_path else rel_path
-                        
-                        # Skip system files and hidden files
-                        system_files = {'.DS_Store', 'Thumbs.db', 'desktop.ini', '.localized'}
-                        if file_name in system_files or file_name.startswith('._') or file_name.startswith('.'):
-                            continue
-                        
-                        # If only_images flag is set, skip non-image files
-                        if only_images_flag and not es_imagen(file_name):
-                            files_skipped += 1
-                            continue
-                        
-                        # Save file
-                        file_path = folder_path / file_name
-                        content = await file.read()
-                        file_path.write_bytes(content)
-                        files_saved += 1
-                        # Reset file pointer for potential reuse
-                        await file.seek(0)
-                    
-                    if only_images_flag and files_skipped > 0:
-                        await broadcast_message(f"   ⏭️ {files_skipped} archivos no-imagen omitidos")
-                    
-                    await broadcast_message(f"   💾 {files_saved} archivos guardados")
-                    
-                    # Use FileProcessor to process this folder
-                    processor = FileProcessor(drive_service)
-                    result = await asyncio.to_thread(
-                        processor.process_folder,
-                        str(folder_path),
-                        articulo_upper,
-                        lista_codigos,
-                        broadcast_message
-                    )
-                    
-                    results.append(result)
-                    
-                    if result.get('exito'):
-                        await broadcast_message(f"   ✅ Carpeta procesada exitosamente")
-                    else:
-                        error = result.get('error', 'Error desconocido')
-                        await broadcast_message(f"   ❌ Error: {error}")
-                        
-            except Exception as e:
-                error_msg = str(e)
-                await broadcast_message(f"   ❌ Error procesando carpeta: {error_msg}")
-                results.append({
-                    'carpeta': folder_name,
-                    'exito': False,
-                    'error': error_msg
-                })
+                directorio_job = job_manager.directorio_de(job['id'])
+                carpetas_guardadas = []
+                for folder_name, files in folders_dict.items():
+                    await guardar_archivos_carpeta(folder_name, files, directorio_job / folder_name, only_images_flag)
+                    carpetas_guardadas.append((folder_name, directorio_job / folder_name))
+                await job_manager.confirmar(job['id'])
+            except BaseException:
+                job_manager.descartar(job['id'])
+                raise
+            
+            job_manager.lanzar(job['id'], lambda job_id: ejecutar_rename(
+                carpetas_guardadas, articulo_upper, lista_codigos, only_images_flag,
+                server_copy_flag, perfil_jpeg, job_id
+            ))
+            await broadcast_message(f"🕒 Trabajo {job['id']} en cola: {total_carpetas} carpetas")
+            return respuesta_job(job)
+        
+        return await ejecutar_rename(
+            list(folders_dict.items()), articulo_upper, lista_codigos, only_images_flag,
+            server_copy_flag, perfil_jpeg
+        )
+        
+    except (ValidationError, FileProcessingError):
+        raise
+    except Exception as e:
+        error_msg = f"Error procesando archivos: {str(e)}"
+        await broadcast_message(f"❌ {error_msg}")
+        raise FileProcessingError(error_msg)
+
+
+async def guardar_archivos_carpeta(folder_name: str, files: List[UploadFile], folder_path: Path,
+                                   only_images_flag: bool) -> Path:
+    """Stream one folder's uploaded files into folder_path, skipping system files"""
+    folder_path.mkdir(parents=True, exist_ok=True)
+    
+    # Save all files to temp folder
+    files_saved = 0
+    files_skipped = 0
+    
+    veredictos = clasificar_nombres(file.filename.split('/')[-1] for file in files)
+    for file, veredicto in zip(files, veredictos):
+        # Skip system files and hidden files
+        if veredicto.estado == OMITIDO:
+            continue
+        
+        # If only_images flag is set, skip non-image files
+        if only_images_flag and veredicto.estado == NO_IMAGEN:
+            files_skipped += 1
+            continue
+        
+        # Save file, streamed in blocks off the event loop
+        file_path = folder_path / veredicto.nombre
+        await asyncio.to_thread(guardar_upload, file, file_path)
+        files_saved += 1
+    
+    if only_images_flag and files_skipped > 0:
+        await broadcast_message(f"   [{folder_name}] ⏭️ {files_skipped} archivos no-imagen omitidos")
+    
+    await broadcast_message(f"   [{folder_name}] 💾 {files_saved} archivos guardados")
+    return folder_path
+
+
+async def ejecutar_rename(carpetas: List[tuple], articulo_upper: str, lista_codigos: List[str],
+                          only_images_flag: bool, server_copy_flag: bool, perfil_jpeg: str,
+                          job_id: str = None) -> dict:
+    """
+    Run the rename pipeline over (folder name, content) pairs, where content is either the
+    folder's uploaded files or the directory a background request persisted them to.
+    With job_id, per-folder progress and results are recorded on that job.
+    """
+    global drive_service
+    
+    try:
+        if not drive_service:
+            drive_service = GoogleDriveService()
+        
+        total_carpetas = len(carpetas)
+        
+        await broadcast_message(f"\n📦 Procesando {total_carpetas} carpetas...")
+        
+        async def guardar_carpeta(indice: int, folder_name: str, contenido, carpeta_trabajo: Path) -> Path:
+            """Save stage: stream one folder's uploaded files into its work directory"""
+            await broadcast_message(f"\n📁 [{indice + 1}/{total_carpetas}] Procesando: {folder_name}")
+            if isinstance(contenido, Path):
+                return contenido
+            return await guardar_archivos_carpeta(
+                folder_name, contenido, carpeta_trabajo / folder_name, only_images_flag
+            )
+        
+        async def carpeta_avanza(indice: int, etapa: str):
+            if job_id:
+                job_manager.actualizar_carpeta(job_id, carpetas[indice][0], status='running', stage=etapa)
+        
+        # Worker threads log through the bridge; flushed before each message sent from here
+        # so a folder's lines always arrive before its outcome
+        log = LogBridge(asyncio.get_running_loop())
+        
+        async def carpeta_terminada(indice: int, result: dict):
+            log.vaciar()
+            folder_name = result.get('carpeta')
+            if result.get('exito'):
+                await broadcast_message(f"   ✅ Carpeta {folder_name} procesada exitosamente")
+            else:
+                error = result.get('error', 'Error desconocido')
+                await broadcast_message(f"   ❌ Error en {folder_name}: {error}")
+            if job_id:
+                job_manager.actualizar_carpeta(
+                    job_id, carpetas[indice][0],
+                    status='completed' if result.get('exito') else 'failed', stage=None, result=result
+                )
+        
+        # Save, convert, upload and archive overlap across folders, several folders per stage
+        pipeline = RenamePipeline(
+            FileProcessor(drive_service),
+            articulo_upper,
+            lista_codigos,
+            log,
+            server_copy_flag,
+            perfil_jpeg,
+            job_id=job_id
+        )
+        results = await pipeline.ejecutar(carpetas, guardar_carpeta, carpeta_terminada, carpeta_avanza)
         
         # Summary
+        log.vaciar()
         exitosas = len([r for r in results if r.get('exito')])
         await broadcast_message(f"\n✅ Completado: {exitosas}/{total_carpetas} carpetas procesadas exitosamente")
         
@@ -348,8 +471,6 @@ async def process_rename(
             "exitosas": exitosas
         }
         
-    except ValidationError:
-        raise
     except Exception as e:
         error_msg = f"Error procesando archivos: {str(e)}"
         await broadcast_message(f"❌ {error_msg}")
@@ -366,20 +487,10 @@ async def get_countries():
             drive_service = GoogleDriveService()
             
         # Navigate to LEBENGOOD/FOTOS/FOTOS ORDENADAS
-        lebengood_id = drive_service.buscar_carpeta_por_nombre("LEBENGOOD")
-        if not lebengood_id:
-            raise FolderNotFoundError("LEBENGOOD")
-        
-        fotos_id = drive_service.buscar_carpeta_por_nombre("FOTOS", lebengood_id)
-        if not fotos_id:
-            raise FolderNotFoundError("FOTOS", "LEBENGOOD")
-        
-        fotos_ordenadas_id = drive_service.buscar_carpeta_por_nombre("FOTOS ORDENADAS", fotos_id)
-        if not fotos_ordenadas_id:
-            raise FolderNotFoundError("FOTOS ORDENADAS", "LEBENGOOD/FOTOS")
+        fotos_ordenadas_id = await asyncio.to_thread(drive_service.resolver_ruta, RUTA_FOTOS_ORDENADAS)
         
         # Get all countries
-        paises = drive_service.listar_carpetas_hijas(fotos_ordenadas_id)
+        paises = await asyncio.to_thread(drive_service.listar_carpetas_hijas, fotos_ordenadas_id)
         
         return {
             "success": True,
@@ -396,9 +507,21 @@ async def get_countries():
 @router.post("/folders/create")
 async def create_folders(
     nombre_carpeta: str = Form(...),
-    paises: str = Form(...)
+    paises: str = Form(...),
+    background: str = Form(default="false"),
+    current_user: models.User = Depends(canal_del_usuario)
 ):
-    """Create folder structure in Google Drive"""
+    """Create folder structure in Google Drive, or queue it as a job with background"""
+    if background.lower() == "true":
+        job = job_manager.crear('folders_create', parametros={"nombre_carpeta": nombre_carpeta, "paises": paises},
+                               usuario=current_user.username)
+        job_manager.lanzar(job['id'], lambda job_id: crear_estructura(nombre_carpeta, paises))
+        return respuesta_job(job)
+    return await crear_estructura(nombre_carpeta, paises)
+
+
+async def crear_estructura(nombre_carpeta: str, paises: str) -> dict:
+    """Create the folder in every selected country below FOTOS ORDENADAS"""
     global drive_service
     
     try:
@@ -415,43 +538,55 @@ async def create_folders(
         
         # Navigate to LEBENGOOD/FOTOS/FOTOS ORDENADAS
         await broadcast_message("\n🔍 Navegando estructura...")
-        lebengood_id = drive_service.buscar_carpeta_por_nombre("LEBENGOOD")
-        if not lebengood_id:
-            raise FolderNotFoundError("LEBENGOOD")
-        
-        fotos_id = drive_service.buscar_carpeta_por_nombre("FOTOS", lebengood_id)
-        if not fotos_id:
-            raise FolderNotFoundError("FOTOS", "LEBENGOOD")
-        
-        fotos_ordenadas_id = drive_service.buscar_carpeta_por_nombre("FOTOS ORDENADAS", fotos_id)
-        if not fotos_ordenadas_id:
-            raise FolderNotFoundError("FOTOS ORDENADAS", "LEBENGOOD/FOTOS")
+        fotos_ordenadas_id = await asyncio.to_thread(drive_service.resolver_ruta, RUTA_FOTOS_ORDENADAS)
         
         # Get all available countries to map names to IDs
-        all_paises = drive_service.listar_carpetas_hijas(fotos_ordenadas_id)
+        all_paises = await asyncio.to_thread(drive_service.listar_carpetas_hijas, fotos_ordenadas_id)
         paises_map = {p['name']: p['id'] for p in all_paises}
+        for p in all_paises:
+            drive_service.folder_cache.guardar(RUTA_FOTOS_ORDENADAS + (p['name'],), p['id'])
         
         total_creadas = 0
         paises_procesados = 0
         
-        # Create structure in selected countries
+        # Look up the folder in every selected country with one batched request,
+        # then create the missing ones with a second one
+        seleccionados = [p for p in lista_paises if p in paises_map]
+        existentes = await asyncio.to_thread(
+            drive_service.buscar_carpetas_lote,
+            [(nombre_carpeta_upper, paises_map[p]) for p in seleccionados]
+        )
+        carpetas_ids = dict(zip(seleccionados, existentes))
+        
+        faltantes = [p for p in seleccionados if not carpetas_ids[p]]
+        if faltantes:
+            creadas = await asyncio.to_thread(
+                drive_service.crear_carpetas_lote,
+                [(nombre_carpeta_upper, paises_map[p]) for p in faltantes]
+            )
+            carpetas_ids.update(zip(faltantes, creadas))
+        
+        # Report results per selected country
         for i, pais_nombre in enumerate(lista_paises, 1):
             if pais_nombre not in paises_map:
                 await broadcast_message(f"\n⚠️ País no encontrado: {pais_nombre}")
                 continue
                 
-            pais_id = paises_map[pais_nombre]
             await broadcast_message(f"\n[{i}/{len(lista_paises)}] 🇪🇸 {pais_nombre}")
             
-            # Create or find main folder
-            carpeta_id = drive_service.buscar_carpeta_por_nombre(nombre_carpeta_upper, pais_id)
-            if not carpeta_id:
-                carpeta_id = drive_service.crear_carpeta_drive(nombre_carpeta_upper, pais_id)
+            carpeta_id = carpetas_ids[pais_nombre]
+            if pais_nombre in faltantes:
+                if not carpeta_id:
+                    await broadcast_message(f"   ❌ Error creando carpeta '{nombre_carpeta_upper}'")
+                    continue
                 await broadcast_message(f"   📁 Carpeta '{nombre_carpeta_upper}' creada")
                 total_creadas += 1
             else:
                 await broadcast_message(f"   ✅ Carpeta '{nombre_carpeta_upper}' ya existe")
             
+            drive_service.folder_cache.guardar(
+                RUTA_FOTOS_ORDENADAS + (pais_nombre, nombre_carpeta_upper), carpeta_id
+            )
             paises_procesados += 1
         
         await broadcast_message(f"\n🎉 ¡Completado! {total_creadas} carpetas creadas")
@@ -473,9 +608,21 @@ async def create_folders(
 @router.post("/photos/gather")
 async def gather_photos(
     pais: str = Form(...),
-    carpeta: str = Form(...)
+    carpeta: str = Form(...),
+    background: str = Form(default="false"),
+    current_user: models.User = Depends(canal_del_usuario)
 ):
-    """Gather photos from Google Drive folder"""
+    """Gather photos from Google Drive folder, or queue it as a job with background"""
+    if background.lower() == "true":
+        job = job_manager.crear('photos_gather', parametros={"pais": pais, "carpeta": carpeta},
+                               usuario=current_user.username)
+        job_manager.lanzar(job['id'], lambda job_id: reunir_fotos(pais, carpeta))
+        return respuesta_job(job)
+    return await reunir_fotos(pais, carpeta)
+
+
+async def reunir_fotos(pais: str, carpeta: str) -> dict:
+    """Pack the photos of a country's folder into a ZIP uploaded next to them"""
     global drive_service
     
     try:
@@ -489,97 +636,37 @@ async def gather_photos(
         
         # Navigate structure
         await broadcast_message("\n📁 Navegando jerarquía...")
-        lebengood_id = drive_service.buscar_carpeta_por_nombre('LEBENGOOD')
-        if not lebengood_id:
-            raise FolderNotFoundError('LEBENGOOD')
-        await broadcast_message("✓ LEBENGOOD")
-        
-        fotos_id = drive_service.buscar_carpeta_por_nombre('FOTOS', lebengood_id)
-        if not fotos_id:
-            raise FolderNotFoundError('FOTOS', 'LEBENGOOD')
-        await broadcast_message("✓ FOTOS")
-        
-        fotos_ordenadas_id = drive_service.buscar_carpeta_por_nombre('FOTOS ORDENADAS', fotos_id)
-        if not fotos_ordenadas_id:
-            raise FolderNotFoundError('FOTOS ORDENADAS', 'LEBENGOOD/FOTOS')
-        await broadcast_message("✓ FOTOS ORDENADAS")
-        
-        pais_id = drive_service.buscar_carpeta_por_nombre(pais_upper, fotos_ordenadas_id)
-        if not pais_id:
-            raise FolderNotFoundError(pais_upper, 'FOTOS ORDENADAS')
-        await broadcast_message(f"✓ {pais_upper}")
-        
-        carpeta_id = drive_service.buscar_carpeta_por_nombre(carpeta_upper, pais_id)
-        if not carpeta_id:
-            raise FolderNotFoundError(carpeta_upper, f'{pais_upper}')
-        await broadcast_message(f"✓ {carpeta_upper}")
-        
-        # Create local ZIP folder
-        carpeta_zip_local = Path("ZIP_TEMP")
-        if carpeta_zip_local.exists():
-            shutil.rmtree(carpeta_zip_local)
-        carpeta_zip_local.mkdir(parents=True, exist_ok=True)
-        
-        await broadcast_message("\n🔍 Buscando fotos...")
-        
-        # 1. Find all images recursively
-        files = await asyncio.to_thread(drive_service.listar_archivos_recursivo, carpeta_id)
-        
-        if not files:
-            await broadcast_message("⚠️ No se encontraron fotos en esta carpeta")
-            return {"success": False, "message": "No se encontraron fotos"}
-            
-        await broadcast_message(f"📸 Se encontraron {len(files)} fotos")
+        ruta = RUTA_FOTOS_ORDENADAS + (pais_upper, carpeta_upper)
+        for nivel in range(1, len(ruta) + 1):
+            # Each prefix is cached, so every level costs at most one new lookup
+            carpeta_id = await asyncio.to_thread(drive_service.resolver_ruta, ruta[:nivel])
+            await broadcast_message(f"✓ {ruta[nivel - 1]}")
         
-        # 2. Download files
-        downloaded_files = []
-        for i, file in enumerate(files, 1):
-            await broadcast_message(f"⬇️ Descargando [{i}/{len(files)}]: {file['name']}")
-            
-            success = await asyncio.to_thread(
-                drive_service.descargar_archivo,
-                file['id'],
-                file['name'],
-                str(carpeta_zip_local)
-            )
-            
-            if success:
-                downloaded_files.append(file['name'])
+        await broadcast_message("\n🔍 Buscando y descargando fotos...")
         
-        if not downloaded_files:
-            raise FileProcessingError("No se pudo descargar ninguna foto")
-            
-        # 3. Create ZIP
-        await broadcast_message("\n📦 Creando archivo ZIP...")
+        # List, download, zip and upload at the same time; nothing touches the local disk
         zip_filename = f"{carpeta_upper}.zip"
-        zip_path = carpeta_zip_local / zip_filename
-        
-        with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for file_name in downloaded_files:
-                file_path = carpeta_zip_local / file_name
-                zipf.write(file_path, file_name)
-        
-        # 4. Upload ZIP
-        await broadcast_message("⬆️ Subiendo ZIP a Drive...")
+        gatherer = PhotoGatherer(drive_service)
+        log = LogBridge(asyncio.get_running_loop())
+        encontradas, descargadas, zip_id = await asyncio.to_thread(
+            gatherer.subir_zip,
+            carpeta_id,
+            zip_filename,
+            log
+        )
+        log.vaciar()
         
-        # Check if ZIP already exists and delete it (optional, to avoid duplicates)
-        existing_zip_id = drive_service.buscar_carpeta_por_nombre(zip_filename, carpeta_id)
-        # Note: buscar_carpeta_por_nombre searches for folders, we might need a file search
-        # For now, just upload a new one
+        if not encontradas:
+            await broadcast_message("⚠️ No se encontraron fotos en esta carpeta")
+            return {"success": False, "message": "No se encontraron fotos"}
         
-        zip_id = await asyncio.to_thread(
-            drive_service.subir_archivo,
-            str(zip_path),
-            carpeta_id
-        )
+        if not descargadas:
+            raise FileProcessingError("No se pudo descargar ninguna foto")
         
         if zip_id:
-            await broadcast_message("✅ ZIP subido exitosamente")
+            await broadcast_message(f"✅ ZIP subido exitosamente ({descargadas}/{encontradas} fotos)")
         else:
             raise DriveServiceError("Error al subir el archivo ZIP")
-            
-        # Cleanup
-        shutil.rmtree(carpeta_zip_local)
         
         await broadcast_message("🎉 Proceso completado")
         
@@ -593,6 +680,44 @@ async def gather_photos(
         raise DriveServiceError(error_msg)
 
 
+def reanudar_rename(job: dict):
+    """Resume a rename job with the folders it had not completed, from its persisted batch"""
+    if not job_manager.lote_guardado(job['id']):
+        return None
+    directorio_job = job_manager.directorio / job['id']
+    parametros = job['parameters']
+    carpetas = [
+        (folder_name, directorio_job / folder_name)
+        for folder_name, progreso in job['folders'].items()
+        if progreso['status'] != 'completed'
+    ]
+    if not carpetas or not all(ruta.is_dir() for _, ruta in carpetas):
+        return None
+    return lambda job_id: ejecutar_rename(
+        carpetas, parametros['articulo'], parametros['codigos'], parametros['only_images'],
+        parametros['server_copy'], parametros['jpeg_profile'], job_id
+    )
+
+
+# Jobs left unfinished by a restart are relaunched from the journal at startup
+job_manager.registrar_reanudacion('rename', reanudar_rename)
+job_manager.registrar_reanudacion('folders_create', lambda job: lambda job_id: crear_estructura(
+    job['parameters']['nombre_carpeta'], job['parameters']['paises']
+))
+job_manager.registrar_reanudacion('photos_gather', lambda job: lambda job_id: reunir_fotos(
+    job['parameters']['pais'], job['parameters']['carpeta']
+))
+
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str, current_user: models.User = Depends(canal_del_usuario)):
+    """Status, per-folder progress and result of a background job of the current user"""
+    job = job_manager.obtener(job_id)
+    if job is None or not puede_ver_job(job, current_user):
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado")
+    return job
+
+
 @router.get("/config/info")
 async def get_config_info():
     """Get system configuration information"""
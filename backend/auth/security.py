@@ -31,23 +31,33 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
-    credentials_exception = HTTPException(
-        status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
-        headers={"WWW-Authenticate": "Bearer"},
-    )
+def _user_from_token(token: str, db: Session) -> Optional[models.User]:
+    """User a JWT belongs to, or None if the token is invalid or names no known user"""
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
         if username is None:
-            raise credentials_exception
+            return None
         token_data = schemas.TokenData(username=username)
     except JWTError:
-        raise credentials_exception
-    user = db.query(models.User).filter(models.User.username == token_data.username).first()
+        return None
+    return db.query(models.User).filter(models.User.username == token_data.username).first()
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    user = _user_from_token(token, db)
     if user is None:
-        raise credentials_exception
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Could not validate credentials",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return user
+
+def get_user_from_token(token: str, db: Session) -> Optional[models.User]:
+    """Active user a JWT belongs to, or None; for callers that cannot use oauth2_scheme (WebSockets)"""
+    user = _user_from_token(token, db)
+    if user is None or not user.is_active:
+        return None
     return user
 
 async def get_current_active_user(current_user: models.User = Depends(get_current_user)):
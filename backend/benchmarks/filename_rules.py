@@ -0,0 +1,94 @@
+"""
+Micro-benchmark of filename classification: compiled rules engine vs the previous per-call helpers
+
+Run from the backend folder:
+    python -m benchmarks.filename_rules [--count 100000] [--repeat 5]
+"""
+import argparse
+import random
+import re
+import statistics
+import time
+from pathlib import Path
+
+from utils.filename_rules import clasificar_nombres
+
+
+def nombres_sinteticos(cantidad: int, semilla: int = 42) -> list:
+    """Mix of valid, badly suffixed, unmarked, lower-case, hidden and non-image names"""
+    aleatorio = random.Random(semilla)
+    plantillas = [
+        "B{n:05d}.PT{pt:02d}.jpg", "B{n:05d}.MAIN.png", "b{n:05d}.pt{pt:02d}.jpeg",
+        "B{n:05d}.main.JPG", "B{n:05d}.PT{pt}.jpg", "IMG_{n:05d}.jpg", "notas {n}.txt",
+        "._B{n:05d}.PT01.jpg", "B{n:05d}.PT{pt:02d}.PT{pt:03d}.webp",
+    ]
+    return [
+        aleatorio.choice(plantillas).format(n=i, pt=aleatorio.randint(0, 120))
+        for i in range(cantidad)
+    ]
+
+
+def clasificar_anterior(nombres: list) -> list:
+    """The per-call checks previously spread over helpers, preview and FileProcessor"""
+    sistema = {'.DS_Store', 'Thumbs.db', 'desktop.ini', '.localized'}
+    resultado = []
+    for nombre in nombres:
+        if nombre in sistema or nombre.startswith('._') or nombre.startswith('.'):
+            resultado.append('omitido')
+            continue
+        extensiones_imagen = {
+            '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff',
+            '.webp', '.raw', '.cr2', '.nef', '.arw', '.dng',
+            '.svg', '.ico', '.jfif'
+        }
+        if Path(nombre).suffix.lower() not in extensiones_imagen:
+            resultado.append('no_imagen')
+            continue
+        nombre_upper = nombre.upper()
+        formato_ok = True
+        if '.PT' in nombre_upper:
+            for match in re.finditer(r'\.PT([^.\s]*)', nombre_upper):
+                sufijo = match.group(1)
+                if not (sufijo and sufijo.isdigit() and len(sufijo) == 2):
+                    formato_ok = False
+                    break
+        if '.PT' not in nombre_upper and '.MAIN' not in nombre_upper:
+            resultado.append('sin_marca')
+            continue
+        corregido = re.sub(r'\.pt(\d*)', r'.PT\1', nombre, flags=re.IGNORECASE)
+        corregido = re.sub(r'\.main', r'.MAIN', corregido, flags=re.IGNORECASE)
+        resultado.append('valido' if formato_ok else 'formato_pt')
+    return resultado
+
+
+def medir(funcion, nombres: list, repeticiones: int) -> float:
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion(nombres)
+        tiempos.append(time.perf_counter() - inicio)
+    return statistics.median(tiempos)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filename classification throughput")
+    parser.add_argument('--count', type=int, default=100_000, help="synthetic names (default 100000)")
+    parser.add_argument('--repeat', type=int, default=5, help="runs per implementation (default 5)")
+    args = parser.parse_args()
+
+    nombres = nombres_sinteticos(args.count)
+    estados_nuevos = [v.estado for v in clasificar_nombres(nombres)]
+    if estados_nuevos != clasificar_anterior(nombres):
+        raise SystemExit("Las dos implementaciones no coinciden")
+
+    anterior = medir(clasificar_anterior, nombres, max(1, args.repeat))
+    nuevo = medir(clasificar_nombres, nombres, max(1, args.repeat))
+    print(f"{args.count} nombres")
+    print(f"{'implementación':<16} {'tiempo (ms)':>12} {'nombres/s':>12}")
+    for etiqueta, tiempo in (('anterior', anterior), ('filename_rules', nuevo)):
+        print(f"{etiqueta:<16} {tiempo * 1000:>12.1f} {args.count / tiempo:>12,.0f}")
+    print(f"aceleración: {anterior / nuevo:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark of the JPEG encoding profiles used for PNG→JPG conversion
+
+Run from the backend folder:
+    python -m benchmarks.jpeg_profiles [file.png ...] [--size 6000] [--repeat 3]
+
+Without PNG files, a synthetic RGBA product shot of --size × --size pixels is used.
+"""
+import argparse
+import contextlib
+import io
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+from services import file_processor
+from services.conversion_cache import ConversionCache
+from services.file_processor import FileProcessor, PERFILES_JPEG
+
+
+def crear_png_sintetico(ruta: Path, lado: int) -> Path:
+    """Write a PNG with transparency, noisy gradients and hard edges, similar to a cut-out product shot"""
+    gradiente = Image.linear_gradient('L').resize((lado, lado))
+    ruido = Image.effect_noise((lado, lado), 24)
+    img = Image.blend(gradiente, ruido, 0.3)
+    # Opaque except for a transparent border, so the noisy background survives flattening
+    alfa = Image.new('L', (lado, lado), 0)
+    borde = lado // 20
+    ImageDraw.Draw(alfa).rectangle((borde, borde, lado - borde - 1, lado - borde - 1), fill=255)
+    img = Image.merge('RGBA', (img, img.rotate(90), gradiente.rotate(180), alfa))
+    dibujo = ImageDraw.Draw(img)
+    margen = lado // 6
+    dibujo.ellipse((margen, margen, lado - margen, lado - margen), fill=(180, 40, 60, 255))
+    dibujo.rectangle((lado // 3, lado // 3, 2 * lado // 3, 2 * lado // 3), fill=(20, 90, 200, 220))
+    img.save(ruta)
+    return ruta
+
+
+def medir_perfil(ruta_png: Path, carpeta: Path, perfil: str, repeticiones: int) -> dict:
+    """Encode one PNG repeatedly with a profile; returns the median time and the output size"""
+    tiempos = []
+    ruta_jpg = None
+    for _ in range(repeticiones):
+        # The conversion logs every file; keep it out of the results table
+        with contextlib.redirect_stdout(io.StringIO()):
+            inicio = time.perf_counter()
+            ruta_jpg = FileProcessor.convertir_png_a_jpg(ruta_png, carpeta, perfil=perfil)
+            tiempos.append(time.perf_counter() - inicio)
+    if ruta_jpg is None:
+        raise RuntimeError(f"La conversión con el perfil '{perfil}' falló")
+    return {'tiempo': statistics.median(tiempos), 'tamano': ruta_jpg.stat().st_size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Encode time and output size per JPEG profile")
+    parser.add_argument('pngs', nargs='*', type=Path, help="PNG files to convert")
+    parser.add_argument('--size', type=int, default=6000, help="side of the synthetic PNG (default 6000)")
+    parser.add_argument('--repeat', type=int, default=3, help="encodes per profile and file (default 3)")
+    args = parser.parse_args()
+
+    # Measure real encodes: with the conversion cache every repeat after the first is a hit
+    file_processor.conversion_cache = ConversionCache(max_mb=0)
+
+    with tempfile.TemporaryDirectory() as temp_dir:
+        carpeta = Path(temp_dir)
+        pngs = args.pngs or [crear_png_sintetico(carpeta / 'sintetico.png', args.size)]
+
+        for ruta_png in pngs:
+            print(f"\n{ruta_png.name} ({ruta_png.stat().st_size / 1e6:.1f} MB)")
+            print(f"{'perfil':<10} {'tiempo (s)':>11} {'tamaño (MB)':>12} {'vs standard':>12}")
+            resultados = {
+                perfil: medir_perfil(ruta_png, carpeta, perfil, max(1, args.repeat))
+                for perfil in PERFILES_JPEG
+            }
+            base = resultados.get('standard')
+            for perfil, r in resultados.items():
+                relativo = f"{r['tiempo'] / base['tiempo']:.2f}x" if base else '-'
+                print(f"{perfil:<10} {r['tiempo']:>11.3f} {r['tamano'] / 1e6:>12.2f} {relativo:>12}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+from sqlalchemy import Column, Float, ForeignKey, Integer, String, Text, UniqueConstraint
+from .database import Base
+
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    type = Column(String)
+    username = Column(String, index=True, nullable=True)
+    status = Column(String, index=True) # queued, running, completed, failed
+    parameters = Column(Text) # JSON of the request form fields
+    folders = Column(Text) # JSON of the per-folder progress
+    result = Column(Text, nullable=True) # JSON
+    error = Column(String, nullable=True)
+    created_at = Column(Float)
+    started_at = Column(Float, nullable=True)
+    finished_at = Column(Float, nullable=True)
+
+class JobItem(Base):
+    __tablename__ = "job_items"
+    __table_args__ = (UniqueConstraint("job_id", "destination_folder_id", "target_name"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(String, ForeignKey("jobs.id"), index=True)
+    destination_folder_id = Column(String)
+    target_name = Column(String)
+    staged_path = Column(String)
+    checksum = Column(String, nullable=True)
+    file_id = Column(String, nullable=True)
+    status = Column(String, default="pending") # pending, uploaded
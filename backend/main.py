@@ -7,17 +7,22 @@ from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse, JSONResponse
 from fastapi.exceptions import RequestValidationError
+import asyncio
 import os
 import logging
 
 from api.routes import router, ws_router
 from auth import models, database
 from auth.routes import router as auth_router
+from jobs import models as jobs_models, database as jobs_database
+from services.job_manager import job_manager
+from services.job_journal import job_journal
 from utils.exceptions import AppException
 import seed
 
 # Create database tables
 models.Base.metadata.create_all(bind=database.engine)
+jobs_models.Base.metadata.create_all(bind=jobs_database.engine)
 # Create initial admin user if not exists
 seed.create_initial_user()
 
@@ -94,6 +99,19 @@ async def general_exception_handler(request: Request, exc: Exception):
     )
 
 
+@app.on_event("startup")
+async def resume_jobs():
+    """Relaunch background jobs a previous process left unfinished"""
+    job_manager.reanudar()
+
+
+@app.on_event("shutdown")
+async def stop_jobs():
+    """Stop the running jobs so they resume on restart, then let the job journal commit its queued writes"""
+    await job_manager.detener()
+    await asyncio.to_thread(job_journal.esperar)
+
+
 # Include API routes
 app.include_router(auth_router)
 app.include_router(router, prefix="/api")
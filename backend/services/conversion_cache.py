@@ -0,0 +1,119 @@
+"""
+Content-addressed on-disk cache of PNG→JPG conversions
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+
+CONVERSION_CACHE_DIR = os.getenv('CONVERSION_CACHE_DIR', 'conversion_cache')
+CONVERSION_CACHE_MAX_MB = int(os.getenv('CONVERSION_CACHE_MAX_MB', '2048'))
+# Bump when the conversion code changes its output for the same parameters
+CONVERSION_CACHE_VERSION = 2
+
+
+class ConversionCache:
+    """
+    Stores converted files under the SHA-256 of the source content plus the encoding
+    parameters, so the same PNG is never decoded and encoded twice. Size is bounded
+    with LRU eviction based on each entry's mtime, which is refreshed on every hit.
+    Safe to share between processes: entries are written atomically and eviction
+    tolerates files removed by another worker.
+    """
+
+    def __init__(self, directorio: str = CONVERSION_CACHE_DIR, max_mb: int = CONVERSION_CACHE_MAX_MB):
+        self.directorio = Path(directorio)
+        self.max_bytes = max_mb * 1024 * 1024
+
+    @property
+    def activa(self) -> bool:
+        return self.max_bytes > 0
+
+    @staticmethod
+    def clave(ruta_origen: Path, parametros: dict, tamano_bloque: int = 1024 * 1024) -> str:
+        """Hash of the source file content together with the conversion parameters"""
+        sha = hashlib.sha256()
+        sha.update(json.dumps({'version': CONVERSION_CACHE_VERSION, **parametros}, sort_keys=True).encode('utf-8'))
+        with open(ruta_origen, 'rb') as archivo:
+            for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+                sha.update(bloque)
+        return sha.hexdigest()
+
+    def _ruta(self, clave: str) -> Path:
+        return self.directorio / clave[:2] / clave
+
+    def obtener(self, clave: str, destino: Path) -> bool:
+        """Place the cached result at destino (hard link, or copy across filesystems); False on a miss"""
+        ruta = self._ruta(clave)
+        try:
+            os.utime(ruta)
+        except OSError:
+            return False
+
+        try:
+            try:
+                os.link(ruta, destino)
+            except FileExistsError:
+                os.unlink(destino)
+                os.link(ruta, destino)
+            except OSError:
+                shutil.copyfile(ruta, destino)
+            return True
+        except OSError as e:
+            print(f"   ⚠️ No se pudo usar la caché de conversión: {e}")
+            return False
+
+    def guardar(self, clave: str, ruta_generada: Path):
+        """Add a freshly converted file to the cache and evict old entries if over budget"""
+        ruta = self._ruta(clave)
+        try:
+            ruta.parent.mkdir(parents=True, exist_ok=True)
+            descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix='.tmp')
+            os.close(descriptor)
+            try:
+                shutil.copyfile(ruta_generada, temporal)
+                os.replace(temporal, ruta)
+            except BaseException:
+                os.unlink(temporal)
+                raise
+        except OSError as e:
+            print(f"   ⚠️ No se pudo guardar en la caché de conversión: {e}")
+            return
+
+        self._recortar()
+
+    def _recortar(self):
+        """Delete least recently used entries until the cache fits in max_bytes"""
+        entradas = []
+        total = 0
+        for subdirectorio in self.directorio.iterdir():
+            if not subdirectorio.is_dir():
+                continue
+            for entrada in os.scandir(subdirectorio):
+                if entrada.name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = entrada.stat()
+                except OSError:
+                    continue
+                entradas.append((stat.st_mtime, stat.st_size, entrada.path))
+                total += stat.st_size
+
+        if total <= self.max_bytes:
+            return
+
+        for _, tamano, ruta in sorted(entradas):
+            try:
+                os.unlink(ruta)
+            except OSError:
+                continue
+            total -= tamano
+            if total <= self.max_bytes:
+                return
+
+
+# Shared by every conversion, including the process pool workers
+conversion_cache = ConversionCache()
@@ -0,0 +1,89 @@
+"""
+Batching layer over the Google Drive batch endpoint
+"""
+import time
+from googleapiclient.errors import HttpError
+from services.drive_executor import PERMANENTE, clasificar_error, drive_executor, motivo_http
+from utils.exceptions import DriveServiceError
+
+
+MAX_BATCH_SIZE = 100  # Drive rejects batches with more than 100 calls
+
+
+def error_desde_http(error: Exception) -> DriveServiceError:
+    """Map a googleapiclient error to a DriveServiceError with status and reason"""
+    if isinstance(error, HttpError):
+        return DriveServiceError(
+            error.reason or str(error),
+            {"status": error.resp.status, "reason": motivo_http(error)}
+        )
+    return DriveServiceError(str(error))
+
+
+class DriveBatch:
+    """
+    Groups Drive metadata requests into batch HTTP requests of up to 100 calls.
+    Each request gets its own callback(response, error), where error is a
+    DriveServiceError or None.
+    """
+
+    def __init__(self, service, http_pool=None, max_size: int = MAX_BATCH_SIZE, executor=drive_executor):
+        self.service = service
+        self.http_pool = http_pool
+        self.max_size = max(1, min(max_size, MAX_BATCH_SIZE))
+        self.executor = executor
+        self._pendientes = []
+
+    def agregar(self, request, callback=None):
+        """Queue a request, sending the batch as soon as it is full"""
+        self._pendientes.append((request, callback))
+        if len(self._pendientes) >= self.max_size:
+            self.ejecutar()
+
+    def ejecutar(self):
+        """
+        Send all queued requests in a single HTTP round trip. Items that fail with a
+        rate-limit or transient error are sent again in a smaller batch after a backoff.
+        """
+        pendientes, self._pendientes = self._pendientes, []
+        intento = 0
+
+        while pendientes:
+            reintentar = []
+            ultimo_error = None
+
+            def al_responder(request_id, response, exception, pendientes=pendientes):
+                nonlocal ultimo_error
+                request, callback = pendientes[int(request_id)]
+                if exception is not None:
+                    if clasificar_error(exception) != PERMANENTE and intento < self.executor.max_reintentos:
+                        reintentar.append((request, callback))
+                        ultimo_error = exception
+                        return
+                if callback:
+                    callback(response, error_desde_http(exception) if exception else None)
+
+            def enviar(pendientes=pendientes, al_responder=al_responder):
+                batch = self.service.new_batch_http_request(callback=al_responder)
+                for i, (request, _) in enumerate(pendientes):
+                    batch.add(request, request_id=str(i))
+                if self.http_pool is None:
+                    batch.execute()
+                    return
+                with self.http_pool.cliente() as http:
+                    batch.execute(http=http)
+
+            self.executor.ejecutar(enviar, costo=len(pendientes))
+
+            if reintentar:
+                time.sleep(self.executor.espera(intento, ultimo_error))
+                intento += 1
+            pendientes = reintentar
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.ejecutar()
+        return False
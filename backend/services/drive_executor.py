@@ -0,0 +1,139 @@
+"""
+Central executor for Google Drive API calls: client-side rate limiting,
+error classification and retries with exponential backoff
+"""
+import os
+import random
+import ssl
+import threading
+import time
+from typing import Callable, TypeVar
+
+import httplib2
+from googleapiclient.errors import HttpError
+
+
+# Requests per minute granted to the project (Drive's default per-user quota is 12,000)
+DRIVE_QUOTA_PER_MINUTE = int(os.getenv('DRIVE_QUOTA_PER_MINUTE', '12000'))
+DRIVE_MAX_RETRIES = int(os.getenv('DRIVE_MAX_RETRIES', '6'))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 64.0
+
+RATE_LIMIT = 'rate_limit'
+TRANSITORIO = 'transitorio'
+PERMANENTE = 'permanente'
+
+RATE_LIMIT_REASONS = {'userRateLimitExceeded', 'rateLimitExceeded'}
+TRANSPORT_ERRORS = (ConnectionError, TimeoutError, ssl.SSLError, httplib2.HttpLib2Error)
+
+T = TypeVar('T')
+
+
+def motivo_http(error: HttpError) -> str:
+    """Return the Drive error reason (e.g. 'userRateLimitExceeded') of an HttpError, if any"""
+    detalles = error.error_details
+    if isinstance(detalles, list) and detalles and isinstance(detalles[0], dict):
+        return detalles[0].get('reason')
+    return None
+
+
+def clasificar_error(error: Exception) -> str:
+    """Classify a Drive error as rate_limit, transitorio (worth retrying) or permanente"""
+    if isinstance(error, HttpError):
+        status = error.resp.status
+        if status == 429 or (status == 403 and motivo_http(error) in RATE_LIMIT_REASONS):
+            return RATE_LIMIT
+        if status in (500, 502, 503, 504):
+            return TRANSITORIO
+        return PERMANENTE
+    if isinstance(error, TRANSPORT_ERRORS):
+        return TRANSITORIO
+    return PERMANENTE
+
+
+def retry_after(error: Exception) -> float:
+    """Seconds requested by a Retry-After header, if the error carries one"""
+    if isinstance(error, HttpError):
+        valor = error.resp.get('retry-after')
+        if valor and valor.strip().isdigit():
+            return float(valor)
+    return None
+
+
+class TokenBucket:
+    """Thread-safe token bucket; callers block until a token is available"""
+
+    def __init__(self, tasa: float, capacidad: float):
+        self.tasa = tasa
+        self.capacidad = capacidad
+        self._tokens = capacidad
+        self._ultimo = time.monotonic()
+        self._pausa_hasta = 0.0
+        self._lock = threading.Lock()
+
+    def adquirir(self, tokens: float = 1):
+        """Take tokens, sleeping as long as needed to stay within the rate"""
+        tokens = min(tokens, self.capacidad)
+        while True:
+            with self._lock:
+                ahora = time.monotonic()
+                if ahora < self._pausa_hasta:
+                    espera = self._pausa_hasta - ahora
+                else:
+                    # Tokens do not accumulate while paused, so traffic resumes gradually
+                    desde = max(self._ultimo, self._pausa_hasta)
+                    self._tokens = min(self.capacidad, self._tokens + (ahora - desde) * self.tasa)
+                    self._ultimo = ahora
+                    if self._tokens >= tokens:
+                        self._tokens -= tokens
+                        return
+                    espera = (tokens - self._tokens) / self.tasa
+            time.sleep(espera)
+
+    def pausar(self, segundos: float):
+        """Stop handing out tokens for a while, e.g. after Drive reports a rate limit"""
+        with self._lock:
+            self._pausa_hasta = max(self._pausa_hasta, time.monotonic() + segundos)
+            self._tokens = 0
+
+
+class DriveExecutor:
+    """
+    Runs Drive calls through a shared token bucket sized to the project quota,
+    retrying rate-limit and transient errors with exponential backoff and full
+    jitter, honouring Retry-After when Drive sends it
+    """
+
+    def __init__(self, quota_por_minuto: int = DRIVE_QUOTA_PER_MINUTE, max_reintentos: int = DRIVE_MAX_RETRIES):
+        tasa = quota_por_minuto / 60.0
+        self.bucket = TokenBucket(tasa, capacidad=max(1.0, tasa))
+        self.max_reintentos = max_reintentos
+
+    def espera(self, intento: int, error: Exception = None) -> float:
+        """Seconds to wait before retry number intento + 1"""
+        solicitada = retry_after(error) if error is not None else None
+        if solicitada is not None:
+            return solicitada
+        return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** intento))
+
+    def ejecutar(self, llamada: Callable[[], T], costo: int = 1) -> T:
+        """Run llamada, retrying it while Drive answers with retryable errors"""
+        for intento in range(self.max_reintentos + 1):
+            self.bucket.adquirir(costo)
+            try:
+                return llamada()
+            except Exception as e:
+                tipo = clasificar_error(e)
+                if tipo == PERMANENTE or intento == self.max_reintentos:
+                    raise
+                espera = self.espera(intento, e)
+                if tipo == RATE_LIMIT:
+                    # Slow every caller down, not just this one
+                    self.bucket.pausar(espera)
+                print(f"   ⏳ Drive {tipo} ({e.__class__.__name__}), reintento "
+                      f"{intento + 1}/{self.max_reintentos} en {espera:.1f}s")
+                time.sleep(espera)
+
+
+# Shared by every GoogleDriveService instance so the quota is enforced process-wide
+drive_executor = DriveExecutor()
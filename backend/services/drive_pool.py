@@ -0,0 +1,97 @@
+"""
+Pool of authorized HTTP clients for the Google Drive API
+"""
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+import google_auth_httplib2
+import httplib2
+
+
+DRIVE_POOL_SIZE = int(os.getenv('DRIVE_POOL_SIZE', '10'))
+DRIVE_HTTP_TIMEOUT = int(os.getenv('DRIVE_HTTP_TIMEOUT', '120'))
+# Seconds to wait for a free client before lending a temporary one, so a caller
+# that holds a client while waiting on others (streaming uploads) cannot deadlock
+DRIVE_POOL_WAIT = float(os.getenv('DRIVE_POOL_WAIT', '5'))
+
+
+class CredencialesSincronizadas:
+    """
+    Wraps a google.auth credentials object so every client in the pool shares it,
+    with token refresh and header application serialized behind one lock
+    """
+
+    def __init__(self, credenciales):
+        self._credenciales = credenciales
+        self._lock = threading.RLock()
+
+    def before_request(self, request, method, url, headers):
+        with self._lock:
+            self._credenciales.before_request(request, method, url, headers)
+
+    def refresh(self, request):
+        with self._lock:
+            self._credenciales.refresh(request)
+
+    def __getattr__(self, nombre):
+        return getattr(self._credenciales, nombre)
+
+
+class DriveHttpPool:
+    """
+    Bounded pool of AuthorizedHttp clients. httplib2 is not thread-safe, so each
+    client is used by one thread at a time; its keep-alive connection is reused
+    across calls instead of opening a new TLS session per request.
+    """
+
+    def __init__(self, credenciales, tamano: int = DRIVE_POOL_SIZE, timeout: int = DRIVE_HTTP_TIMEOUT):
+        self.credenciales = CredencialesSincronizadas(credenciales)
+        self.tamano = max(1, tamano)
+        self.timeout = timeout
+        self._libres = queue.LifoQueue()
+        self._creados = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _nuevo_cliente(self):
+        return google_auth_httplib2.AuthorizedHttp(
+            self.credenciales, http=httplib2.Http(timeout=self.timeout)
+        )
+
+    def _tomar(self):
+        try:
+            return self._libres.get_nowait(), True
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._creados < self.tamano:
+                self._creados += 1
+                return self._nuevo_cliente(), True
+        try:
+            return self._libres.get(timeout=DRIVE_POOL_WAIT), True
+        except queue.Empty:
+            return self._nuevo_cliente(), False
+
+    @contextmanager
+    def cliente(self):
+        """
+        Check out a client for the calling thread. Nested checkouts on the same
+        thread reuse the client it already holds.
+        """
+        actual = getattr(self._local, 'cliente', None)
+        if actual is not None:
+            yield actual
+            return
+
+        cliente, del_pool = self._tomar()
+        self._local.cliente = cliente
+        try:
+            yield cliente
+        finally:
+            self._local.cliente = None
+            if del_pool:
+                self._libres.put(cliente)
+            else:
+                cliente.close()
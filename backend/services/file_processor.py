@@ -1,10 +1,16 @@
 """
 File processing service for image conversion and file operations
 """
-import shutil
-import re
+import multiprocessing
+import os
+import tempfile
+import threading
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, as_completed, wait
 from pathlib import Path
-from typing import List, Tuple
+from typing import Iterable, Iterator, List, Tuple
+from services.conversion_cache import conversion_cache
+from services.memory_budget import memory_budget
 
 try:
     from PIL import Image
@@ -13,12 +19,73 @@ except ImportError:
     PIL_DISPONIBLE = False
 
 
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', '4'))
+# Conversion processes; by default the CPUs this process may run on, capped so a big
+# host does not spawn a pool far larger than the memory budget can feed
+CONVERSION_WORKERS_MAX = 4
+try:
+    _CPUS_DISPONIBLES = len(os.sched_getaffinity(0))
+except AttributeError:
+    _CPUS_DISPONIBLES = os.cpu_count() or 1
+CONVERSION_WORKERS = int(os.getenv('CONVERSION_WORKERS', str(min(_CPUS_DISPONIBLES, CONVERSION_WORKERS_MAX))))
+
+# JPEG encoding profiles for PNG conversion; subsampling 0 = 4:4:4, 1 = 4:2:2, 2 = 4:2:0.
+# 'standard' matches the historical quality=95, optimize=True output.
+PERFILES_JPEG = {
+    'fast': {'quality': 85, 'optimize': False, 'progressive': False, 'subsampling': 2,
+             'keep_icc': False, 'keep_exif': False},
+    'balanced': {'quality': 90, 'optimize': False, 'progressive': False, 'subsampling': 2,
+                 'keep_icc': True, 'keep_exif': False},
+    'standard': {'quality': 95, 'optimize': True, 'progressive': False, 'subsampling': 2,
+                 'keep_icc': False, 'keep_exif': False},
+    'archival': {'quality': 98, 'optimize': True, 'progressive': True, 'subsampling': 0,
+                 'keep_icc': True, 'keep_exif': True},
+}
+PERFIL_JPEG_POR_DEFECTO = os.getenv('JPEG_PROFILE', 'standard')
+
+# Rows flattened at a time when compositing transparent images onto white
+CONVERSION_STRIP_HEIGHT = int(os.getenv('CONVERSION_STRIP_HEIGHT', '256'))
+MODOS_CON_ALFA = {'RGBA', 'LA', 'PA', 'RGBa', 'La'}
+# Bytes per pixel PIL keeps in memory for each mode (RGB and LA are padded to 4), for the memory estimate
+BYTES_POR_PIXEL = {'1': 1, 'L': 1, 'P': 1, 'I;16': 2, 'LA': 4, 'PA': 4, 'RGB': 4, 'RGBA': 4, 'I': 4, 'F': 4}
+
+_pool_conversion = None
+_pool_conversion_lock = threading.Lock()
+
+
+def _obtener_pool_conversion() -> ProcessPoolExecutor:
+    """Process pool shared by every conversion in the server, created on first use"""
+    global _pool_conversion
+    with _pool_conversion_lock:
+        if _pool_conversion is None:
+            # spawn: forking a process that runs threads can deadlock the child
+            _pool_conversion = ProcessPoolExecutor(
+                max_workers=max(1, CONVERSION_WORKERS),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return _pool_conversion
+
+
+def _descartar_pool_conversion():
+    """Drop a broken pool so the next conversion starts a fresh one"""
+    global _pool_conversion
+    with _pool_conversion_lock:
+        if _pool_conversion is not None:
+            _pool_conversion.shutdown(wait=False)
+            _pool_conversion = None
+
+
 class FileProcessor:
     """Handles file processing operations"""
     
     @staticmethod
-    def convertir_png_a_jpg(ruta_png: Path, carpeta_destino: Path, calidad: int = 95) -> Path:
-        """Convert PNG to JPG"""
+    def convertir_png_a_jpg(ruta_png: Path, carpeta_destino: Path, calidad: int = None,
+                            perfil: str = PERFIL_JPEG_POR_DEFECTO) -> Path:
+        """
+        Convert PNG to JPG with one of the PERFILES_JPEG encoding profiles (calidad overrides
+        its quality). Results are looked up in the conversion cache by source content and
+        encoding parameters before decoding anything.
+        """
         if not PIL_DISPONIBLE:
             print(f"❌ Cannot convert {ruta_png.name}: PIL not available")
             return None
@@ -28,17 +95,46 @@ class FileProcessor:
             nombre_jpg = f"{nombre_sin_extension}.jpg"
             ruta_jpg = carpeta_destino / nombre_jpg
             
+            ajustes = PERFILES_JPEG[perfil]
+            if calidad is not None:
+                ajustes = {**ajustes, 'quality': calidad}
+            
+            clave_cache = None
+            if conversion_cache.activa:
+                clave_cache = conversion_cache.clave(ruta_png, ajustes)
+                if conversion_cache.obtener(clave_cache, ruta_jpg):
+                    print(f"   ♻️ PNG→JPG (caché): {ruta_png.name} → {nombre_jpg}")
+                    return ruta_jpg
+            
             with Image.open(ruta_png) as img:
-                if img.mode in ('RGBA', 'LA', 'P'):
-                    fondo = Image.new('RGB', img.size, (255, 255, 255))
-                    if img.mode == 'P':
-                        img = img.convert('RGBA')
-                    fondo.paste(img, mask=img.split()[-1] if img.mode == 'RGBA' else None)
-                    img = fondo
-                elif img.mode != 'RGB':
-                    img = img.convert('RGB')
+                opciones = {
+                    'quality': ajustes['quality'],
+                    'optimize': ajustes['optimize'],
+                    'progressive': ajustes['progressive'],
+                    'subsampling': ajustes['subsampling'],
+                }
+                if ajustes['keep_icc'] and img.info.get('icc_profile'):
+                    opciones['icc_profile'] = img.info['icc_profile']
+                if ajustes['keep_exif'] and img.info.get('exif'):
+                    opciones['exif'] = img.info['exif']
                 
-                img.save(ruta_jpg, 'JPEG', quality=calidad, optimize=True)
+                salida = FileProcessor.componer_sobre_blanco(img)
+                if salida is not img:
+                    img.close()  # free the decoded source before the encoder allocates its buffers
+                
+                # ruta_jpg may be a hard link to a cache entry from an earlier hit: write a
+                # new file and swap it in instead of truncating the shared one
+                descriptor, temporal = tempfile.mkstemp(dir=carpeta_destino, suffix='.jpg.tmp')
+                os.close(descriptor)
+                try:
+                    salida.save(temporal, 'JPEG', **opciones)
+                    os.replace(temporal, ruta_jpg)
+                except BaseException:
+                    os.unlink(temporal)
+                    raise
+            
+            if clave_cache:
+                conversion_cache.guardar(clave_cache, ruta_jpg)
             
             print(f"   🔄 PNG→JPG: {ruta_png.name} → {nombre_jpg}")
             return ruta_jpg
@@ -48,32 +144,129 @@ class FileProcessor:
             return None
     
     @staticmethod
-    def procesar_archivos_con_conversion(
+    def componer_sobre_blanco(img: 'Image.Image', alto_franja: int = CONVERSION_STRIP_HEIGHT) -> 'Image.Image':
+        """
+        Flatten an image onto a white RGB canvas in horizontal strips. Only one strip at a
+        time is converted to RGBA, so the peak is the decoded source plus the RGB output
+        instead of the extra full-size RGBA copy and alpha band a whole-image paste needs.
+        RGB images are returned unchanged.
+        """
+        if img.mode == 'RGB':
+            return img
+        
+        con_alfa = img.mode in MODOS_CON_ALFA or 'transparency' in img.info
+        ancho, alto = img.size
+        salida = Image.new('RGB', img.size, (255, 255, 255))
+        for y in range(0, alto, max(1, alto_franja)):
+            caja = (0, y, ancho, min(alto, y + alto_franja))
+            franja = img.crop(caja)
+            if con_alfa:
+                franja = franja.convert('RGBA')
+                salida.paste(franja, caja, franja)
+            else:
+                salida.paste(franja.convert('RGB'), caja)
+        return salida
+    
+    @staticmethod
+    def estimar_memoria_conversion(ruta_png: Path) -> int:
+        """
+        Bytes a conversion needs at its peak, read from the image header: the decoded
+        source, the RGB output and one RGBA strip. 0 if the header cannot be read.
+        """
+        if not PIL_DISPONIBLE:
+            return 0
+        try:
+            with Image.open(ruta_png) as img:
+                ancho, alto = img.size
+                bytes_pixel = BYTES_POR_PIXEL.get(img.mode, 4)
+        except Exception:
+            return 0
+        return ancho * alto * (bytes_pixel + 4) + ancho * min(alto, CONVERSION_STRIP_HEIGHT) * 4
+    
+    @staticmethod
+    def convertir_lote(rutas_png: List[Path], carpeta_destino: Path, calcular_hash: bool = False,
+                       perfil: str = PERFIL_JPEG_POR_DEFECTO) -> Iterator[Tuple[Path, Path, str]]:
+        """
+        Convert PNGs to JPG on the shared process pool, yielding (PNG, JPG or None, MD5)
+        as each conversion finishes. The MD5 of the JPG is computed in the worker when
+        calcular_hash is set. Conversions are only submitted while their estimated memory
+        fits in the process-wide CONVERSION_MEMORY_BUDGET_MB. Falls back to converting in
+        this thread if the pool fails.
+        """
+        if not rutas_png:
+            return
+        
+        try:
+            pool = _obtener_pool_conversion()
+        except Exception as e:
+            print(f"   ⚠️ Pool de conversión no disponible ({e}), convirtiendo en este hilo")
+            _descartar_pool_conversion()
+            for ruta in rutas_png:
+                yield (ruta, *_convertir_y_hashear(ruta, carpeta_destino, calcular_hash, perfil))
+            return
+        
+        pendientes = deque((ruta, FileProcessor.estimar_memoria_conversion(ruta)) for ruta in rutas_png)
+        futuros = {}
+        while pendientes or futuros:
+            # Submit while the estimate fits in the shared budget; wait for it only when
+            # nothing of ours is in flight, otherwise collect our finished conversions first
+            while pendientes:
+                ruta, costo = pendientes[0]
+                if not memory_budget.reservar(costo, esperar=not futuros):
+                    break
+                try:
+                    futuro = pool.submit(_convertir_y_hashear, ruta, carpeta_destino, calcular_hash, perfil)
+                    pendientes.popleft()
+                except Exception as e:
+                    memory_budget.liberar(costo)
+                    print(f"   ⚠️ Pool de conversión no disponible ({e}), convirtiendo en este hilo")
+                    _descartar_pool_conversion()
+                    for ruta, _ in pendientes:
+                        yield (ruta, *_convertir_y_hashear(ruta, carpeta_destino, calcular_hash, perfil))
+                    pendientes.clear()
+                    break
+                futuro.add_done_callback(lambda _, costo=costo: memory_budget.liberar(costo))
+                futuros[futuro] = ruta
+            
+            if not futuros:
+                continue
+            terminados, _ = wait(futuros, return_when=FIRST_COMPLETED)
+            for futuro in terminados:
+                ruta = futuros.pop(futuro)
+                try:
+                    ruta_jpg, md5 = futuro.result()
+                except Exception as e:
+                    print(f"   ⚠️ Conversión de {ruta.name} fallida en el pool ({e}), reintentando en este hilo")
+                    _descartar_pool_conversion()
+                    ruta_jpg, md5 = _convertir_y_hashear(ruta, carpeta_destino, calcular_hash, perfil)
+                yield ruta, ruta_jpg, md5
+    
+    @staticmethod
+    def iterar_plan(
         archivos_originales: List[Path], 
         carpeta_temporal: Path, 
-        lista_strings: List[str]
-    ) -> Tuple[int, int]:
-        """Process files with PNG to JPG conversion and renaming"""
-        total_generadas = 0
-        png_convertidos = 0
+        lista_strings: List[str],
+        checksums: dict = None,
+        contador: dict = None,
+        perfil_jpeg: str = PERFIL_JPEG_POR_DEFECTO
+    ) -> Iterator[Tuple[str, Path]]:
+        """
+        Yield the (generated name, source file) pairs of a folder as each source becomes
+        ready, without copying anything on disk: every code-named variant points at the
+        same source, which uploads and the ZIP read under each of its names.
+        Files that need no conversion come first; PNGs follow in the order their JPG
+        conversion finishes on the process pool, so uploads can start meanwhile.
+        If a checksums dict is given, it is filled with {generated name: MD5}, hashing
+        each source once; contador['png_convertidos'] counts the conversions.
+        PNGs are encoded with the perfil_jpeg profile from PERFILES_JPEG.
+        """
+        from utils.helpers import calcular_md5
         
-        archivos_a_procesar = {}
+        if contador is not None:
+            contador.setdefault('png_convertidos', 0)
+        nombres_generados = set()
         
-        # Convert PNGs if necessary
-        for archivo in archivos_originales:
-            if archivo.name.lower().endswith('.png'):
-                archivo_convertido = FileProcessor.convertir_png_a_jpg(archivo, carpeta_temporal)
-                if archivo_convertido:
-                    png_convertidos += 1
-                    archivos_a_procesar[archivo] = archivo_convertido
-                    print(f"   ✅ PNG converted: {archivo.name} → {archivo_convertido.name}")
-                else:
-                    archivos_a_procesar[archivo] = archivo
-            else:
-                archivos_a_procesar[archivo] = archivo
-        
-        # Process each file with all codes
-        for archivo_original, archivo_a_usar in archivos_a_procesar.items():
+        def variantes(archivo_original: Path, archivo_a_usar: Path, md5: str):
             nombre_archivo_base = archivo_a_usar.name
             primer_punto = nombre_archivo_base.find('.')
             
@@ -84,113 +277,201 @@ class FileProcessor:
             
             for string_nuevo in lista_strings:
                 nuevo_nombre = f"{string_nuevo}{extension}"
-                ruta_nueva = carpeta_temporal / nuevo_nombre
-                
-                try:
-                    if archivo_a_usar.parent == carpeta_temporal:
-                        if archivo_a_usar.exists():
-                            if len(lista_strings) > 1:
-                                shutil.copy2(archivo_a_usar, ruta_nueva)
-                            else:
-                                archivo_a_usar.rename(ruta_nueva)
-                            total_generadas += 1
-                        else:
-                            print(f"   ⚠️ Converted file not found: {archivo_a_usar.name}")
-                    else:
-                        shutil.copy2(archivo_a_usar, ruta_nueva)
-                        total_generadas += 1
-                    
-                except Exception as e:
-                    print(f"   ❌ Error processing {archivo_original.name} → {nuevo_nombre}: {e}")
+                if nuevo_nombre in nombres_generados:
+                    print(f"   ⚠️ {archivo_original.name} → {nuevo_nombre} ya generado por otro archivo, se omite")
+                    continue
+                nombres_generados.add(nuevo_nombre)
+                if md5:
+                    checksums[nuevo_nombre] = md5
+                yield nuevo_nombre, archivo_a_usar
         
-        # Clean up temporary converted files
-        for archivo_original, archivo_usado in archivos_a_procesar.items():
-            if (archivo_usado.parent == carpeta_temporal and 
-                archivo_usado.exists() and 
-                archivo_original.name.lower().endswith('.png')):
-                try:
-                    if len(lista_strings) > 1:
-                        archivo_usado.unlink()
-                except:
-                    pass
+        pngs = []
+        for archivo in archivos_originales:
+            if archivo.name.lower().endswith('.png'):
+                pngs.append(archivo)
+                continue
+            md5 = calcular_md5(archivo) if checksums is not None else None
+            yield from variantes(archivo, archivo, md5)
         
-        return total_generadas, png_convertidos
+        # Convert PNGs if necessary
+        for archivo, archivo_convertido, md5 in FileProcessor.convertir_lote(
+            pngs, carpeta_temporal, checksums is not None, perfil_jpeg
+        ):
+            if archivo_convertido:
+                if contador is not None:
+                    contador['png_convertidos'] += 1
+                print(f"   ✅ PNG converted: {archivo.name} → {archivo_convertido.name}")
+            else:
+                archivo_convertido = archivo
+                md5 = calcular_md5(archivo) if checksums is not None else None
+            yield from variantes(archivo, archivo_convertido, md5)
     
     @staticmethod
-    def validar_archivos_imagen(carpeta: Path) -> Tuple[List[Path], List[str]]:
-        """Validate and normalize image file names"""
-        from utils.helpers import es_imagen
+    def validar_archivos_imagen(carpeta: Path) -> Tuple[List[Path], List[str], List[str], List[str]]:
+        """
+        Validate and normalize image file names, classifying the whole folder in one pass.
+        Returns (images, names without .PT/.MAIN, renames done, names with a bad .PT suffix).
+        """
+        from utils.filename_rules import clasificar_nombres, FORMATO_PT, NO_IMAGEN, OMITIDO, SIN_MARCA
         
-        archivos = [
-            archivo for archivo in carpeta.iterdir() 
-            if archivo.is_file() and es_imagen(archivo.name)
-        ]
+        rutas = {archivo.name: archivo for archivo in carpeta.iterdir() if archivo.is_file()}
         
+        archivos = []
         archivos_invalidos = []
         archivos_renombrados = []
+        archivos_pt_invalidos = []
         
-        for archivo in archivos:
-            nombre_archivo = archivo.name
-            nombre_upper = nombre_archivo.upper()
+        for veredicto in clasificar_nombres(rutas):
+            if veredicto.estado in (OMITIDO, NO_IMAGEN):
+                continue
+            if veredicto.estado == SIN_MARCA:
+                archivos_invalidos.append(veredicto.nombre)
+                continue
             
-            if '.PT' not in nombre_upper and '.MAIN' not in nombre_upper:
-                archivos_invalidos.append(archivo.name)
-            else:
-                nombre_corregido = nombre_archivo
-                nombre_corregido = re.sub(r'\.pt(\d*)', r'.PT\1', nombre_corregido, flags=re.IGNORECASE)
-                nombre_corregido = re.sub(r'\.main', r'.MAIN', nombre_corregido, flags=re.IGNORECASE)
-                
-                if nombre_corregido != nombre_archivo:
-                    try:
-                        nueva_ruta = archivo.parent / nombre_corregido
-                        archivo.rename(nueva_ruta)
-                        archivos_renombrados.append(f"{nombre_archivo} → {nombre_corregido}")
-                        print(f"   ✅ Renamed: {nombre_archivo} → {nombre_corregido}")
-                    except Exception as e:
-                        print(f"   ❌ Error renaming {nombre_archivo}: {e}")
-        
-        # Refresh file list after renaming
-        if archivos_renombrados:
-            archivos = [archivo for archivo in carpeta.iterdir() if archivo.is_file()]
+            archivo = rutas[veredicto.nombre]
+            nombre_corregido = veredicto.nombre_normalizado
+            if nombre_corregido != veredicto.nombre:
+                try:
+                    nueva_ruta = archivo.parent / nombre_corregido
+                    archivo.rename(nueva_ruta)
+                    archivo = nueva_ruta
+                    archivos_renombrados.append(f"{veredicto.nombre} → {nombre_corregido}")
+                    print(f"   ✅ Renamed: {veredicto.nombre} → {nombre_corregido}")
+                except Exception as e:
+                    print(f"   ❌ Error renaming {veredicto.nombre}: {e}")
+            
+            if veredicto.estado == FORMATO_PT:
+                archivos_pt_invalidos.append(archivo.name)
+            archivos.append(archivo)
         
-        return archivos, archivos_invalidos, archivos_renombrados
+        return archivos, archivos_invalidos, archivos_renombrados, archivos_pt_invalidos
     
-    def __init__(self, google_drive_service):
-        """Initialize with Google Drive service"""
+    def __init__(self, google_drive_service, upload_workers: int = UPLOAD_WORKERS):
+        """Initialize with Google Drive service and the number of concurrent uploads"""
         self.drive_service = google_drive_service
+        self.upload_workers = max(1, upload_workers)
     
-    def process_folder(self, carpeta_path: str, articulo: str, lista_codigos: List[str], broadcast_callback=None) -> dict:
+    def subir_archivos(self, plan: Iterable[Tuple[str, Path]], carpeta_destino_id: str, log=print,
+                       checksums: dict = None, existentes: dict = None,
+                       copia_servidor: bool = False, job_id: str = None) -> List[dict]:
         """
-        Process a folder with file renaming and upload to Google Drive
-        Replicates the logic from the original tkinter script
+        Upload planned (name, source file) pairs to a Drive folder with up to
+        upload_workers concurrent uploads. The plan is consumed lazily, so each upload
+        starts as soon as its source is ready.
+        existentes maps names already in the folder to their Drive metadata: a file whose
+        local MD5 (from checksums) matches is skipped, one whose content differs is
+        updated in place. With copia_servidor, each source is sent once and its other
+        names are created with batched server-side copies.
+        With job_id, every file is recorded in the job journal before it is sent and
+        marked with its Drive ID once there, and files the journal already has as
+        uploaded with the same checksum are skipped, so a resumed job continues where
+        the previous process stopped.
+        Returns one result per name with either 'file_id' or 'error', plus 'omitido',
+        'actualizado' or 'copiado' when no new content was uploaded ('reanudado' too when
+        the job journal skipped it).
         """
-        from utils.helpers import extraer_pais_de_ruta, extraer_color_de_nombre, transformar_nombre_carpeta, validar_formato_pt
-        import tempfile
+        # Imported here so the conversion workers, which import this module, never load SQLAlchemy
+        from services.job_journal import job_journal
+        
+        checksums = checksums if checksums is not None else {}
+        existentes = existentes or {}
+        completadas = job_journal.subidas_completadas(job_id, carpeta_destino_id) if job_id else {}
+        
+        def registrar(resultado: dict) -> dict:
+            if job_id and resultado.get('file_id'):
+                nombre = resultado['archivo']
+                job_journal.marcar_subido(job_id, carpeta_destino_id, nombre, resultado['file_id'], checksums.get(nombre))
+            return resultado
+        
+        def subir(nombre: str, origen: Path, remoto: dict) -> dict:
+            try:
+                if remoto:
+                    file_id = self.drive_service.actualizar_archivo_drive(remoto['id'], str(origen), checksums.get(nombre))
+                    if file_id:
+                        return {'archivo': nombre, 'file_id': file_id, 'actualizado': True}
+                else:
+                    file_id = self.drive_service.subir_archivo_drive(
+                        str(origen), nombre, carpeta_destino_id, checksums.get(nombre)
+                    )
+                    if file_id:
+                        return {'archivo': nombre, 'file_id': file_id}
+                log(f"   ❌ Falló la subida de {nombre} (ID nulo)")
+                return {'archivo': nombre, 'error': "ID nulo"}
+            except Exception as e:
+                log(f"   ❌ Error subiendo {nombre}: {e}")
+                return {'archivo': nombre, 'error': str(e)}
+        
+        resultados = []
+        fuentes = {}  # source file -> ID of a Drive file with the same content
+        enviados = set()
+        copias = []
+        
+        with ThreadPoolExecutor(max_workers=self.upload_workers) as executor:
+            futuros = {}
+            for nombre, origen in plan:
+                remoto = existentes.get(nombre)
+                md5 = checksums.get(nombre)
+                journal_md5, journal_id = completadas.get(nombre, (None, None))
+                if md5 and md5 == journal_md5:
+                    resultados.append({'archivo': nombre, 'file_id': journal_id, 'omitido': True, 'reanudado': True})
+                    fuentes.setdefault(origen, journal_id)
+                elif remoto and md5 and md5 == remoto.get('md5Checksum'):
+                    resultados.append({'archivo': nombre, 'file_id': remoto['id'], 'omitido': True})
+                    fuentes.setdefault(origen, remoto['id'])
+                elif copia_servidor and remoto is None and (origen in fuentes or origen in enviados):
+                    # A source already on Drive (or about to be) is copied instead of uploaded again
+                    copias.append((nombre, origen))
+                else:
+                    if job_id:
+                        job_journal.registrar_pendiente(job_id, carpeta_destino_id, nombre, str(origen), md5)
+                    futuros[executor.submit(subir, nombre, origen, remoto)] = origen
+                    enviados.add(origen)
+            
+            for futuro in as_completed(futuros):
+                resultado = registrar(futuro.result())
+                if resultado.get('file_id'):
+                    fuentes.setdefault(futuros[futuro], resultado['file_id'])
+                resultados.append(resultado)
+        
+        if copias:
+            log(f"   📑 Copiando {len(copias)} archivos dentro de Google Drive...")
+            copiables = [(nombre, origen) for nombre, origen in copias if origen in fuentes]
+            ids = self.drive_service.copiar_archivos_lote([
+                (fuentes[origen], nombre, carpeta_destino_id) for nombre, origen in copiables
+            ])
+            for (nombre, _), file_id in zip(copiables, ids):
+                if file_id:
+                    resultados.append(registrar({'archivo': nombre, 'file_id': file_id, 'copiado': True}))
+                else:
+                    log(f"   ❌ Falló la copia de {nombre}")
+                    resultados.append({'archivo': nombre, 'error': "Copia fallida"})
+            for nombre, origen in copias:
+                if origen not in fuentes:
+                    resultados.append({'archivo': nombre, 'error': "Original no subido"})
+        
+        return resultados
+    
+    def preparar_carpeta(self, carpeta_path: str, articulo: str, lista_codigos: List[str], carpeta_trabajo: Path,
+                         log=print, copia_servidor: bool = False, perfil_jpeg: str = PERFIL_JPEG_POR_DEFECTO,
+                         job_id: str = None) -> dict:
+        """
+        First stage of a folder: validate its images, work out country and color, resolve
+        the Drive destination and list what is already there. Returns the folder's job
+        state for convertir_carpeta, subir_carpeta and archivar_carpeta, or a failed
+        result with 'exito' False. Converted files are written below carpeta_trabajo.
+        job_id, when the folder belongs to a background job, is passed on to subir_archivos.
+        """
+        from utils.helpers import extraer_pais_de_ruta, extraer_color_de_nombre, transformar_nombre_carpeta
         
         carpeta = Path(carpeta_path)
         carpeta_nombre = carpeta.name
         
-        def log(message):
-            """Helper to log messages"""
-            print(message)
-            if broadcast_callback:
-                # Since broadcast_callback might be async, we need to handle it
-                import asyncio
-                try:
-                    loop = asyncio.get_event_loop()
-                    if loop.is_running():
-                        asyncio.create_task(broadcast_callback(message))
-                    else:
-                        loop.run_until_complete(broadcast_callback(message))
-                except:
-                    pass  # If async doesn't work, just print
-        
         if not carpeta.exists():
             return {'carpeta': carpeta_nombre, 'exito': False, 'error': f"La carpeta '{carpeta_path}' no existe"}
         
         # Validate and get image files
         log(f"   🔍 Validando archivos...")
-        archivos, archivos_invalidos, archivos_renombrados = self.validar_archivos_imagen(carpeta)
+        archivos, archivos_invalidos, archivos_renombrados, archivos_pt_invalidos = self.validar_archivos_imagen(carpeta)
         
         if archivos_renombrados:
             log(f"   🔄 {len(archivos_renombrados)} archivos renombrados a mayúsculas")
@@ -204,11 +485,6 @@ class FileProcessor:
         log(f"   🖼️ Encontradas {len(archivos)} imágenes válidas")
         
         # Validate .PT format
-        archivos_pt_invalidos = []
-        for archivo in archivos:
-            if not validar_formato_pt(archivo.name):
-                archivos_pt_invalidos.append(archivo.name)
-        
         if archivos_pt_invalidos:
             return {'carpeta': carpeta_nombre, 'exito': False, 'error': f"Formato .PT incorrecto: {', '.join(archivos_pt_invalidos)}"}
         
@@ -230,59 +506,154 @@ class FileProcessor:
         if not carpeta_destino_id:
             return {'carpeta': carpeta_nombre, 'exito': False, 'error': "No se encontró/creó la estructura en Google Drive"}
         
+        carpeta_temporal = Path(carpeta_trabajo) / f"{articulo}_{carpeta.name}"
+        carpeta_temporal.mkdir(exist_ok=True)
+        
+        # List what is already in the destination once, so re-runs only send changes
+        existentes = {
+            archivo['name']: archivo
+            for archivo in self.drive_service.listar_archivos_con_checksum(carpeta_destino_id)
+        }
+        if existentes:
+            log(f"   🔎 {len(existentes)} archivos ya existen en el destino")
+        
+        return {
+            'carpeta': carpeta_nombre,
+            'exito': True,
+            'archivos': archivos,
+            'lista_codigos': lista_codigos,
+            'carpeta_temporal': carpeta_temporal,
+            'carpeta_destino_id': carpeta_destino_id,
+            'existentes': existentes,
+            'copia_servidor': copia_servidor,
+            'perfil_jpeg': perfil_jpeg,
+            'job_id': job_id,
+            'checksums': {},
+            'contador': {},
+            'plan': []
+        }
+    
+    def convertir_carpeta(self, trabajo: dict) -> Iterator[Tuple[str, Path]]:
+        """Conversion stage: yield the folder's plan entries as they become ready, recording them in the job"""
+        for entrada in self.iterar_plan(
+            trabajo['archivos'], trabajo['carpeta_temporal'], trabajo['lista_codigos'],
+            trabajo['checksums'], trabajo['contador'], trabajo['perfil_jpeg']
+        ):
+            trabajo['plan'].append(entrada)
+            yield entrada
+    
+    def subir_carpeta(self, trabajo: dict, entradas: Iterable[Tuple[str, Path]], log=print):
+        """Upload stage: upload plan entries as they arrive and record the results in the job"""
+        log(f"   ☁️ Subiendo archivos a Google Drive...")
+        resultados_subida = self.subir_archivos(
+            entradas, trabajo['carpeta_destino_id'], log, trabajo['checksums'],
+            trabajo['existentes'], trabajo['copia_servidor'], trabajo.get('job_id')
+        )
+        trabajo['resultados_subida'] = resultados_subida
+        
+        total_generadas = len(trabajo['plan'])
+        png_convertidos = trabajo['contador'].get('png_convertidos', 0)
+        
+        if png_convertidos > 0:
+            log(f"   🔄 Convertidos {png_convertidos} archivos PNG a JPG")
+        
+        log(f"   ✅ Generados {total_generadas} archivos")
+        archivos_sin_cambios = sum(1 for r in resultados_subida if r.get('omitido'))
+        archivos_actualizados = sum(1 for r in resultados_subida if r.get('actualizado'))
+        archivos_copiados = sum(1 for r in resultados_subida if r.get('copiado'))
+        archivos_subidos = sum(1 for r in resultados_subida if r.get('file_id') and not r.get('omitido'))
+        
+        log(f"   ✅ {archivos_subidos}/{total_generadas} archivos subidos a Google Drive")
+        if archivos_copiados:
+            log(f"   📑 {archivos_copiados} de ellos copiados en el servidor sin volver a subirlos")
+        if archivos_sin_cambios:
+            log(f"   ⏭️ {archivos_sin_cambios} archivos sin cambios omitidos")
+        if archivos_actualizados:
+            log(f"   ♻️ {archivos_actualizados} archivos actualizados en su lugar")
+    
+    def archivar_carpeta(self, trabajo: dict, log=print) -> dict:
+        """Archive stage: stream the folder's ZIP into Drive and build its final result"""
+        plan = trabajo['plan']
+        existentes = trabajo['existentes']
+        resultados_subida = trabajo.get('resultados_subida', [])
+        
+        nombre_zip = f"{trabajo['carpeta_temporal'].name}.zip"
+        zip_existente = existentes.get(nombre_zip)
+        # Files skipped because a resumed job had already sent them did change the folder
+        sin_cambios = (
+            len(resultados_subida) == len(plan)
+            and all(r.get('omitido') and not r.get('reanudado') for r in resultados_subida)
+        )
+        
+        # Create and upload ZIP, streamed straight into Drive; a re-run that changed nothing
+        # keeps the existing one instead of sending the whole batch again
+        if zip_existente and plan and sin_cambios:
+            log(f"   ⏭️ ZIP sin cambios, se conserva el existente")
+        else:
+            self._subir_zip(trabajo, nombre_zip, zip_existente, log)
+        
+        return {
+            'carpeta': trabajo['carpeta'],
+            'exito': True,
+            'archivos_procesados': len(plan),
+            'archivos_subidos': sum(1 for r in resultados_subida if r.get('file_id') and not r.get('omitido')),
+            'archivos_sin_cambios': sum(1 for r in resultados_subida if r.get('omitido')),
+            'archivos_copiados': sum(1 for r in resultados_subida if r.get('copiado')),
+            'errores_subida': [r for r in resultados_subida if r.get('error')],
+            'png_convertidos': trabajo['contador'].get('png_convertidos', 0)
+        }
+    
+    def _subir_zip(self, trabajo: dict, nombre_zip: str, zip_existente: dict, log=print):
+        """Stream the folder's plan into a ZIP on Drive, replacing zip_existente in place if given"""
+        try:
+            log(f"   📦 Creando y subiendo ZIP a Google Drive...")
+            # The staged files stay on disk, so the upload can be journaled and resumed
+            zip_id, _ = self.drive_service.subir_zip_en_streaming(
+                sorted(trabajo['plan']), nombre_zip, trabajo['carpeta_destino_id'],
+                file_id=zip_existente['id'] if zip_existente else None,
+                reanudable=True
+            )
+            if zip_id:
+                log(f"   ✅ ZIP subido exitosamente")
+            else:
+                log(f"   ❌ Error subiendo ZIP")
+            
+        except Exception as e:
+            log(f"   ❌ Error procesando ZIP: {e}")
+    
+    def process_folder(self, carpeta_path: str, articulo: str, lista_codigos: List[str], broadcast_callback=None,
+                       copia_servidor: bool = False, perfil_jpeg: str = PERFIL_JPEG_POR_DEFECTO) -> dict:
+        """
+        Process a folder with file renaming and upload to Google Drive
+        Replicates the logic from the original tkinter script.
+        With copia_servidor, each image is uploaded once and its other code-named
+        variants are created with server-side Drive copies. PNGs are converted with
+        the perfil_jpeg encoding profile.
+        Runs the preparar/convertir/subir/archivar stages back to back; RenamePipeline
+        overlaps them across folders.
+        broadcast_callback receives every log line and is called from the calling
+        thread; to reach WebSocket clients from a worker thread pass a LogBridge.
+        """
+        log = broadcast_callback or print
+        
         # Process files in temp directory
         with tempfile.TemporaryDirectory() as temp_dir:
-            carpeta_temporal = Path(temp_dir) / f"{articulo}_{carpeta.name}"
-            carpeta_temporal.mkdir(exist_ok=True)
-            
-            log(f"   📁 Procesando archivos...")
-            total_generadas, png_convertidos = self.procesar_archivos_con_conversion(
-                archivos, carpeta_temporal, lista_codigos
+            trabajo = self.preparar_carpeta(
+                carpeta_path, articulo, lista_codigos, Path(temp_dir), log, copia_servidor, perfil_jpeg
             )
+            if not trabajo['exito']:
+                return trabajo
             
-            if png_convertidos > 0:
-                log(f"   🔄 Convertidos {png_convertidos} archivos PNG a JPG")
-            
-            log(f"   ✅ Generados {total_generadas} archivos")
-            
-            # Upload files to Google Drive
-            log(f"   ☁️ Subiendo archivos a Google Drive...")
-            archivos_procesados = list(carpeta_temporal.iterdir())
-            archivos_subidos = 0
-            
-            for archivo_procesado in archivos_procesados:
-                if archivo_procesado.is_file():
-                    try:
-                        file_id = self.drive_service.subir_archivo(str(archivo_procesado), carpeta_destino_id)
-                        if file_id:
-                            archivos_subidos += 1
-                        else:
-                            log(f"   ❌ Falló la subida de {archivo_procesado.name} (ID nulo)")
-                    except Exception as e:
-                        log(f"   ❌ Error subiendo {archivo_procesado.name}: {e}")
-            
-            log(f"   ✅ {archivos_subidos}/{len(archivos_procesados)} archivos subidos a Google Drive")
-            
-            # Create and upload ZIP
-            try:
-                log(f"   📦 Creando archivo ZIP...")
-                zip_path = shutil.make_archive(
-                    str(carpeta_temporal),
-                    'zip',
-                    str(carpeta_temporal)
-                )
-                
-                log(f"   ☁️ Subiendo ZIP a Google Drive...")
-                self.drive_service.subir_archivo(zip_path, carpeta_destino_id)
-                log(f"   ✅ ZIP subido exitosamente")
-                
-            except Exception as e:
-                log(f"   ❌ Error procesando ZIP: {e}")
-            
-            return {
-                'carpeta': carpeta_nombre,
-                'exito': True,
-                'archivos_procesados': total_generadas,
-                'archivos_subidos': archivos_subidos,
-                'png_convertidos': png_convertidos
-            }
+            # Upload files to Google Drive while the PNGs are still being converted
+            log(f"   📁 Procesando archivos...")
+            self.subir_carpeta(trabajo, self.convertir_carpeta(trabajo), log)
+            return self.archivar_carpeta(trabajo, log)
+
+def _convertir_y_hashear(ruta_png: Path, carpeta_destino: Path, calcular_hash: bool,
+                         perfil: str = PERFIL_JPEG_POR_DEFECTO) -> Tuple[Path, str]:
+    """Conversion task run in the process pool; must stay a module-level function to be picklable"""
+    from utils.helpers import calcular_md5
+    
+    ruta_jpg = FileProcessor.convertir_png_a_jpg(ruta_png, carpeta_destino, perfil=perfil)
+    md5 = calcular_md5(ruta_jpg) if ruta_jpg and calcular_hash else None
+    return ruta_jpg, md5
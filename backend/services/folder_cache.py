@@ -0,0 +1,94 @@
+"""
+Thread-safe cache of Google Drive folder IDs keyed by their path
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Iterator, Optional, Sequence
+
+
+FOLDER_CACHE_TTL = int(os.getenv('FOLDER_CACHE_TTL', '600'))
+FOLDER_CACHE_MAX_ENTRIES = int(os.getenv('FOLDER_CACHE_MAX_ENTRIES', '2048'))
+
+
+class FolderCache:
+    """Path → folder ID cache with TTL expiry and LRU eviction"""
+
+    def __init__(self, ttl: int = FOLDER_CACHE_TTL, max_entries: int = FOLDER_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        # Path → [lock, holders and waiters]; an entry lives only while a creation is in progress
+        self._bloqueos_creacion = {}
+
+    def obtener(self, ruta: Sequence[str]) -> Optional[str]:
+        """Return the cached folder ID for a path, or None if missing/expired"""
+        clave = tuple(ruta)
+        with self._lock:
+            entrada = self._entradas.get(clave)
+            if entrada is None:
+                return None
+            folder_id, expira = entrada
+            if expira < time.monotonic():
+                del self._entradas[clave]
+                return None
+            self._entradas.move_to_end(clave)
+            return folder_id
+
+    def guardar(self, ruta: Sequence[str], folder_id: str):
+        """Store the folder ID for a path, evicting the least recently used entries"""
+        clave = tuple(ruta)
+        with self._lock:
+            self._entradas[clave] = (folder_id, time.monotonic() + self.ttl)
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.max_entries:
+                self._entradas.popitem(last=False)
+
+    def invalidar_id(self, folder_id: str):
+        """Drop every path that resolved to this folder ID, plus everything below it"""
+        with self._lock:
+            rutas = [clave for clave, (fid, _) in self._entradas.items() if fid == folder_id]
+            self._invalidar_rutas(rutas)
+
+    def invalidar_ruta(self, ruta: Sequence[str]):
+        """Drop a path and everything below it"""
+        with self._lock:
+            self._invalidar_rutas([tuple(ruta)])
+
+    @contextmanager
+    def bloqueo_creacion(self, ruta: Sequence[str]) -> Iterator[None]:
+        """
+        Hold a path's creation lock, so concurrent callers do not create it twice.
+        The lock is dropped once its last holder or waiter leaves.
+        """
+        clave = tuple(ruta)
+        with self._lock:
+            entrada = self._bloqueos_creacion.setdefault(clave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if not entrada[1]:
+                    del self._bloqueos_creacion[clave]
+
+    def limpiar(self):
+        """Remove all entries"""
+        with self._lock:
+            self._entradas.clear()
+
+    def _invalidar_rutas(self, rutas: list):
+        if not rutas:
+            return
+        for clave in list(self._entradas):
+            if any(clave[:len(ruta)] == ruta for ruta in rutas):
+                del self._entradas[clave]
+
+
+# Shared by every GoogleDriveService instance so the cache survives re-authentication
+folder_cache = FolderCache()
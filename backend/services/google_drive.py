@@ -2,20 +2,39 @@
 Google Drive API service layer
 """
 import os
+import io
 import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
+from typing import Iterable, Iterator, List, Sequence, Tuple
 from google.auth.transport.requests import Request
 from google.oauth2 import service_account
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, MediaIoBaseDownload
-from utils.exceptions import AuthenticationError
+from services.drive_batch import DriveBatch
+from services.drive_executor import drive_executor
+from services.drive_pool import DriveHttpPool
+from services.folder_cache import folder_cache
+from services.upload_journal import upload_journal
+from services.zip_stream import ZipStreamUpload
+from utils.exceptions import AuthenticationError, FolderNotFoundError
 
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
 CREDENTIALS_FILE = 'credentials.json'
 TOKEN_FILE = 'token.json'
+RUTA_FOTOS_ORDENADAS = ("LEBENGOOD", "FOTOS", "FOTOS ORDENADAS")
+
+# Resumable upload chunks must be a multiple of 256 KB
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+LIST_PAGE_SIZE = 1000
+LIST_PARENTS_PER_QUERY = int(os.getenv('LIST_PARENTS_PER_QUERY', '20'))
+LIST_WORKERS = int(os.getenv('LIST_WORKERS', '4'))
 
 
 class GoogleDriveService:
@@ -25,6 +44,10 @@ class GoogleDriveService:
         """Initialize Google Drive service"""
         self.creds = None
         self.service = None
+        self.folder_cache = folder_cache
+        self.upload_journal = upload_journal
+        self.executor = drive_executor
+        self.http_pool = None
         
         # 1. Try Service Account (Preferred for Server)
         # Check env var first, then file
@@ -90,31 +113,78 @@ class GoogleDriveService:
              raise AuthenticationError("No se encontraron credenciales válidas (ni Service Account ni OAuth)")
 
         self.service = build('drive', 'v3', credentials=self.creds)
+        self.http_pool = DriveHttpPool(self.creds)
     
     def is_authenticated(self) -> bool:
         """Check if service is authenticated"""
         return self.service is not None
     
+    def _ejecutar(self, request):
+        """Execute a Drive request on a pooled connection through the rate-limited retry executor"""
+        def llamada():
+            with self.http_pool.cliente() as http:
+                return request.execute(http=http)
+        return self.executor.ejecutar(llamada)
+    
+    def _invalidar_si_no_existe(self, error: Exception, folder_id: str):
+        """Forget a cached folder ID when Drive reports that it no longer exists"""
+        if folder_id and isinstance(error, HttpError) and error.resp.status == 404:
+            self.folder_cache.invalidar_id(folder_id)
+    
+    def _peticion_buscar_carpeta(self, nombre_carpeta: str, parent_folder_id: str = None):
+        """Build (without executing) the files().list request that finds a folder by name"""
+        query = f"name='{nombre_carpeta}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        if parent_folder_id:
+            query += f" and '{parent_folder_id}' in parents"
+        
+        return self.service.files().list(q=query, fields="files(id, name)")
+    
+    def _peticion_crear_carpeta(self, nombre_carpeta: str, parent_folder_id: str = None):
+        """Build (without executing) the files().create request for a folder"""
+        folder_metadata = {
+            'name': nombre_carpeta,
+            'mimeType': 'application/vnd.google-apps.folder',
+        }
+        
+        if parent_folder_id:
+            folder_metadata['parents'] = [parent_folder_id]
+        
+        return self.service.files().create(body=folder_metadata, fields='id')
+    
+    def _peticion_listar_carpetas(self, parent_folder_id: str):
+        """Build (without executing) the files().list request for the subfolders of a folder"""
+        query = f"'{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        return self.service.files().list(q=query, fields="files(id, name)")
+    
+    def _peticion_copiar_archivo(self, file_id: str, nombre_archivo: str, parent_folder_id: str = None):
+        """Build (without executing) the files().copy request that duplicates a file server-side"""
+        file_metadata = {'name': nombre_archivo}
+        
+        if parent_folder_id:
+            file_metadata['parents'] = [parent_folder_id]
+        
+        return self.service.files().copy(fileId=file_id, body=file_metadata, fields='id')
+    
+    def nuevo_lote(self) -> DriveBatch:
+        """Start a batch of metadata requests sent over pooled connections"""
+        return DriveBatch(self.service, http_pool=self.http_pool, executor=self.executor)
+    
     def buscar_carpeta_por_nombre(self, nombre_carpeta: str, parent_folder_id: str = None) -> str:
         """Search for a folder by name and return its ID"""
         if not self.service:
             return None
         
         try:
-            query = f"name='{nombre_carpeta}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            if parent_folder_id:
-                query += f" and '{parent_folder_id}' in parents"
-            
-            results = self.service.files().list(
-                q=query,
-                fields="files(id, name)"
-            ).execute()
+            results = self._ejecutar(self._peticion_buscar_carpeta(
+                nombre_carpeta, parent_folder_id
+            ))
             
             items = results.get('files', [])
             if items:
                 return items[0]['id']
             return None
         except Exception as e:
+            self._invalidar_si_no_existe(e, parent_folder_id)
             print(f"Error buscando carpeta '{nombre_carpeta}': {e}")
             return None
     
@@ -124,21 +194,13 @@ class GoogleDriveService:
             return None
         
         try:
-            folder_metadata = {
-                'name': nombre_carpeta,
-                'mimeType': 'application/vnd.google-apps.folder',
-            }
-            
-            if parent_folder_id:
-                folder_metadata['parents'] = [parent_folder_id]
-            
-            folder = self.service.files().create(
-                body=folder_metadata,
-                fields='id'
-            ).execute()
+            folder = self._ejecutar(self._peticion_crear_carpeta(
+                nombre_carpeta, parent_folder_id
+            ))
             
             return folder.get('id')
         except Exception as e:
+            self._invalidar_si_no_existe(e, parent_folder_id)
             print(f"Error creating folder: {e}")
             return None
     
@@ -148,20 +210,196 @@ class GoogleDriveService:
             return []
         
         try:
-            query = f"'{parent_folder_id}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            
-            results = self.service.files().list(
-                q=query,
-                fields="files(id, name)"
-            ).execute()
+            results = self._ejecutar(self._peticion_listar_carpetas(parent_folder_id))
             
             return results.get('files', [])
         except Exception as e:
+            self._invalidar_si_no_existe(e, parent_folder_id)
             print(f"Error listing subfolders: {e}")
             return []
     
-    def subir_archivo_drive(self, ruta_archivo: str, nombre_archivo: str, parent_folder_id: str = None) -> str:
-        """Upload a file to Google Drive"""
+    def buscar_carpetas_lote(self, carpetas: List[Tuple[str, str]]) -> List[str]:
+        """
+        Search several folders given as (name, parent_folder_id) pairs using batched
+        requests. Returns the folder IDs in the same order, None for missing folders.
+        """
+        if not self.service:
+            return [None] * len(carpetas)
+        
+        ids = [None] * len(carpetas)
+        
+        def al_responder(indice):
+            def callback(response, error):
+                if error:
+                    nombre_carpeta, parent_folder_id = carpetas[indice]
+                    if error.details.get('status') == 404:
+                        self.folder_cache.invalidar_id(parent_folder_id)
+                    print(f"Error buscando carpeta '{nombre_carpeta}': {error.message}")
+                    return
+                items = response.get('files', [])
+                if items:
+                    ids[indice] = items[0]['id']
+            return callback
+        
+        try:
+            with self.nuevo_lote() as lote:
+                for i, (nombre_carpeta, parent_folder_id) in enumerate(carpetas):
+                    lote.agregar(self._peticion_buscar_carpeta(nombre_carpeta, parent_folder_id), al_responder(i))
+        except Exception as e:
+            print(f"Error en lote de búsqueda de carpetas: {e}")
+        
+        return ids
+    
+    def crear_carpetas_lote(self, carpetas: List[Tuple[str, str]]) -> List[str]:
+        """
+        Create several folders given as (name, parent_folder_id) pairs using batched
+        requests. Returns the new folder IDs in the same order, None for failures.
+        """
+        if not self.service:
+            return [None] * len(carpetas)
+        
+        ids = [None] * len(carpetas)
+        
+        def al_responder(indice):
+            def callback(response, error):
+                if error:
+                    nombre_carpeta, parent_folder_id = carpetas[indice]
+                    if error.details.get('status') == 404:
+                        self.folder_cache.invalidar_id(parent_folder_id)
+                    print(f"Error creating folder '{nombre_carpeta}': {error.message}")
+                    return
+                ids[indice] = response.get('id')
+            return callback
+        
+        try:
+            with self.nuevo_lote() as lote:
+                for i, (nombre_carpeta, parent_folder_id) in enumerate(carpetas):
+                    lote.agregar(self._peticion_crear_carpeta(nombre_carpeta, parent_folder_id), al_responder(i))
+        except Exception as e:
+            print(f"Error en lote de creación de carpetas: {e}")
+        
+        return ids
+    
+    def listar_carpetas_hijas_lote(self, parent_folder_ids: List[str]) -> List[list]:
+        """List the subfolders of several parents using batched requests"""
+        if not self.service:
+            return [[] for _ in parent_folder_ids]
+        
+        hijas = [[] for _ in parent_folder_ids]
+        
+        def al_responder(indice):
+            def callback(response, error):
+                if error:
+                    if error.details.get('status') == 404:
+                        self.folder_cache.invalidar_id(parent_folder_ids[indice])
+                    print(f"Error listing subfolders: {error.message}")
+                    return
+                hijas[indice] = response.get('files', [])
+            return callback
+        
+        try:
+            with self.nuevo_lote() as lote:
+                for i, parent_folder_id in enumerate(parent_folder_ids):
+                    lote.agregar(self._peticion_listar_carpetas(parent_folder_id), al_responder(i))
+        except Exception as e:
+            print(f"Error en lote de listado de carpetas: {e}")
+        
+        return hijas
+    
+    def copiar_archivos_lote(self, copias: List[Tuple[str, str, str]]) -> List[str]:
+        """
+        Copy files inside Drive, given as (source file ID, new name, parent_folder_id),
+        using batched requests so no content is uploaded. Returns the new file IDs in
+        the same order, None for failures.
+        """
+        if not self.service:
+            return [None] * len(copias)
+        
+        ids = [None] * len(copias)
+        
+        def al_responder(indice):
+            def callback(response, error):
+                if error:
+                    print(f"Error copying to '{copias[indice][1]}': {error.message}")
+                    return
+                ids[indice] = response.get('id')
+            return callback
+        
+        try:
+            with self.nuevo_lote() as lote:
+                for i, (file_id, nombre_archivo, parent_folder_id) in enumerate(copias):
+                    lote.agregar(self._peticion_copiar_archivo(file_id, nombre_archivo, parent_folder_id), al_responder(i))
+        except Exception as e:
+            print(f"Error en lote de copia de archivos: {e}")
+        
+        return ids
+    
+    def _reanudar_sesion(self, request, sesion: dict, http):
+        """
+        Point a resumable request at a journaled session, asking Drive which bytes it
+        already has. Returns the uploaded file if the session had in fact completed.
+        """
+        # A streamed ZIP's size is unknown until its last chunk
+        tamano = '*' if sesion['tamano'] is None else sesion['tamano']
+        resp, content = http.request(
+            sesion['uri'], 'PUT',
+            headers={'Content-Range': f"bytes */{tamano}", 'Content-Length': '0'}
+        )
+        if resp.status in (200, 201):
+            return request.postproc(resp, content)
+        if resp.status != 308:
+            raise HttpError(resp, content, uri=sesion['uri'])
+        
+        rango = resp.get('range')
+        request.resumable_uri = sesion['uri']
+        request.resumable_progress = int(rango.split('-')[-1]) + 1 if rango else 0
+        return None
+    
+    def _subir_por_bloques(self, request, media, clave: str = None, extra: dict = None) -> dict:
+        """
+        Run a resumable upload chunk by chunk, retrying each chunk through the executor.
+        With a journal key, the session URI and
+        the acknowledged offset are recorded after every chunk, together with extra,
+        and a journaled session for the same key is resumed instead of starting again
+        from byte 0.
+        """
+        def reanudar():
+            with self.http_pool.cliente() as http:
+                return self._reanudar_sesion(request, sesion, http)
+        
+        def enviar_bloque():
+            with self.http_pool.cliente() as http:
+                return request.next_chunk(http=http)
+        
+        sesion = self.upload_journal.obtener(clave) if clave else None
+        if sesion and sesion['tamano'] == media.size():
+            try:
+                file = self.executor.ejecutar(reanudar)
+                if file is not None:
+                    self.upload_journal.eliminar(clave)
+                    return file
+                print(f"   ↪️ Reanudando subida desde el byte {request.resumable_progress}")
+            except HttpError:
+                # Session expired or unknown; start a new one
+                self.upload_journal.eliminar(clave)
+        
+        # A failed chunk leaves the request in its error state, so the retry first asks
+        # Drive for the acknowledged range and resends from there
+        file = None
+        while file is None:
+            status, file = self.executor.ejecutar(enviar_bloque)
+            if clave and status:
+                self.upload_journal.guardar(
+                    clave, request.resumable_uri, request.resumable_progress, media.size(), extra
+                )
+        
+        if clave:
+            self.upload_journal.eliminar(clave)
+        return file
+    
+    def subir_archivo_drive(self, ruta_archivo: str, nombre_archivo: str, parent_folder_id: str = None,
+                            md5: str = None) -> str:
+        """Upload a file to Google Drive in resumable chunks; md5, if known, saves rehashing it for the journal"""
         if not self.service:
             return None
         
@@ -171,23 +409,49 @@ class GoogleDriveService:
             if parent_folder_id:
                 file_metadata['parents'] = [parent_folder_id]
             
-            media = MediaFileUpload(str(ruta_archivo), resumable=True)
+            media = MediaFileUpload(str(ruta_archivo), chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
             
-            file = self.service.files().create(
+            request = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id'
-            ).execute()
+            )
+            
+            # Only uploads spanning several chunks are worth journaling
+            clave = None
+            if media.size() > UPLOAD_CHUNK_SIZE:
+                clave = self.upload_journal.clave(ruta_archivo, nombre_archivo, parent_folder_id, md5=md5)
             
+            file = self._subir_por_bloques(request, media, clave)
             return file.get('id')
         except Exception as e:
             import traceback
+            self._invalidar_si_no_existe(e, parent_folder_id)
             print(f"❌ Error uploading {nombre_archivo}: {e}")
             traceback.print_exc()
             return None
     
-    def subir_zip_desde_memoria(self, zip_buffer, nombre_zip: str, parent_folder_id: str = None) -> tuple:
-        """Upload a ZIP file from memory to Google Drive"""
+    def actualizar_archivo_drive(self, file_id: str, ruta_archivo: str, md5: str = None) -> str:
+        """Replace the content of an existing Drive file in place, keeping its ID and name"""
+        if not self.service:
+            return None
+        
+        try:
+            media = MediaFileUpload(str(ruta_archivo), chunksize=UPLOAD_CHUNK_SIZE, resumable=True)
+            request = self.service.files().update(fileId=file_id, media_body=media, fields='id')
+            
+            clave = None
+            if media.size() > UPLOAD_CHUNK_SIZE:
+                clave = self.upload_journal.clave(ruta_archivo, Path(ruta_archivo).name, destino=file_id, md5=md5)
+            
+            file = self._subir_por_bloques(request, media, clave)
+            return file.get('id')
+        except Exception as e:
+            print(f"❌ Error updating {Path(ruta_archivo).name}: {e}")
+            return None
+    
+    def subir_zip_desde_memoria(self, zip_buffer: io.BytesIO, nombre_zip: str, parent_folder_id: str = None) -> tuple:
+        """Upload a ZIP file from memory to Google Drive, resuming an interrupted upload of the same bytes"""
         if not self.service:
             return None, None
         
@@ -203,16 +467,102 @@ class GoogleDriveService:
                 resumable=True
             )
             
-            file = self.service.files().create(
+            request = self.service.files().create(
                 body=file_metadata,
                 media_body=media,
                 fields='id,webViewLink'
-            ).execute()
+            )
+            
+            clave = None
+            if media.size() > UPLOAD_CHUNK_SIZE:
+                clave = self.upload_journal.clave_zip(
+                    [(nombre_zip, zip_buffer.getvalue())], nombre_zip, parent_folder_id
+                )
+            
+            file = self._subir_por_bloques(request, media, clave)
+            
+            return file.get('id'), file.get('webViewLink')
+        except Exception as e:
+            self._invalidar_si_no_existe(e, parent_folder_id)
+            print(f"Error uploading ZIP: {e}")
+            return None, None
+    
+    def subir_zip_en_streaming(self, entradas: Iterable[Tuple[str, object]], nombre_zip: str,
+                               parent_folder_id: str = None, file_id: str = None,
+                               reanudable: bool = False) -> tuple:
+        """
+        Build a ZIP from (arcname, path or bytes) entries while uploading it to Drive
+        chunk by chunk, without writing the archive to disk or holding it in memory.
+        When file_id is given, that existing file is updated in place instead.
+        With reanudable, entradas is read twice (to key the upload, then to build it),
+        so it must be a sequence of entries that stay on disk; the upload is journaled
+        and an interrupted one with the same entries and target resumes where Drive
+        left off, rebuilding the archive byte for byte with the journaled timestamp.
+        """
+        if not self.service:
+            return None, None
+        
+        clave = extra = None
+        fecha = None
+        if reanudable:
+            clave = self.upload_journal.clave_zip(entradas, nombre_zip, parent_folder_id, file_id)
+            sesion = self.upload_journal.obtener(clave)
+            fecha = tuple(sesion['fecha']) if sesion and sesion.get('fecha') else time.localtime()[:6]
+            extra = {'fecha': fecha}
+        
+        media = ZipStreamUpload(entradas, fecha=fecha)
+        try:
+            if file_id:
+                request = self.service.files().update(
+                    fileId=file_id,
+                    media_body=media,
+                    fields='id,webViewLink'
+                )
+            else:
+                file_metadata = {'name': nombre_zip}
+                
+                if parent_folder_id:
+                    file_metadata['parents'] = [parent_folder_id]
+                
+                request = self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id,webViewLink'
+                )
             
+            file = self._subir_por_bloques(request, media, clave, extra)
             return file.get('id'), file.get('webViewLink')
         except Exception as e:
+            self._invalidar_si_no_existe(e, parent_folder_id)
             print(f"Error uploading ZIP: {e}")
             return None, None
+        finally:
+            media.cancelar()
+    
+    def listar_archivos_con_checksum(self, folder_id: str) -> list:
+        """List the files (not folders) directly inside a folder with their name, size and md5Checksum"""
+        if not self.service:
+            return []
+        
+        query = f"'{folder_id}' in parents and mimeType!='application/vnd.google-apps.folder' and trashed=false"
+        archivos = []
+        page_token = None
+        try:
+            while True:
+                results = self._ejecutar(self.service.files().list(
+                    q=query,
+                    fields="nextPageToken, files(id, name, size, md5Checksum)",
+                    pageSize=LIST_PAGE_SIZE,
+                    pageToken=page_token
+                ))
+                archivos.extend(results.get('files', []))
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    return archivos
+        except Exception as e:
+            self._invalidar_si_no_existe(e, folder_id)
+            print(f"Error listing files with checksums: {e}")
+            return []
     
     def obtener_archivos_en_carpeta(self, folder_id: str) -> list:
         """Get all files in a folder"""
@@ -220,7 +570,7 @@ class GoogleDriveService:
             return []
         
         query = f"parents in '{folder_id}'"
-        results = self.service.files().list(q=query).execute()
+        results = self._ejecutar(self.service.files().list(q=query))
         return results.get('files', [])
     
     def descargar_archivo(self, file_id: str, file_name: str, destination_path: str) -> bool:
@@ -232,17 +582,39 @@ class GoogleDriveService:
             request = self.service.files().get_media(fileId=file_id)
             file_path = os.path.join(destination_path, file_name)
             
-            with open(file_path, 'wb') as file:
+            with self.http_pool.cliente() as http, open(file_path, 'wb') as file:
+                request.http = http
                 downloader = MediaIoBaseDownload(file, request)
                 done = False
                 while done is False:
-                    status, done = downloader.next_chunk()
+                    status, done = self.executor.ejecutar(downloader.next_chunk)
             
             return True
         except Exception as e:
             print(f"Error downloading {file_name}: {e}")
             return False
     
+    def descargar_a_memoria(self, file_id: str, file_name: str) -> bytes:
+        """Download a file from Drive into memory, returns its content or None"""
+        if not self.service:
+            return None
+        
+        try:
+            request = self.service.files().get_media(fileId=file_id)
+            
+            buffer = io.BytesIO()
+            with self.http_pool.cliente() as http:
+                request.http = http
+                downloader = MediaIoBaseDownload(buffer, request)
+                done = False
+                while done is False:
+                    status, done = self.executor.ejecutar(downloader.next_chunk)
+            
+            return buffer.getvalue()
+        except Exception as e:
+            print(f"Error downloading {file_name}: {e}")
+            return None
+    
     def logout(self):
         """Remove authentication token"""
         if os.path.exists(TOKEN_FILE):
@@ -251,80 +623,121 @@ class GoogleDriveService:
             return True
         return False
     
-    def navegar_y_crear_estructura(self, articulo: str, pais: str, color: str) -> str:
+    def resolver_ruta(self, ruta: Sequence[str], crear: bool = False) -> str:
         """
-        Navigate through LEBENGOOD/FOTOS/FOTOS ORDENADAS/{PAÍS}/{ARTÍCULO}/{COLOR}
-        and create any missing folders, returns the final folder ID
+        Resolve a folder path such as LEBENGOOD/FOTOS/FOTOS ORDENADAS to its ID.
+        Starts from the longest cached prefix and only queries Drive for the rest.
+        Missing folders are created when crear is True, otherwise FolderNotFoundError is raised.
         """
         if not self.service:
             return None
         
-        # Navigation path
-        ruta_navegacion = [
-            ("LEBENGOOD", None),
-            ("FOTOS", "LEBENGOOD"),
-            ("FOTOS ORDENADAS", "FOTOS"),
-            (pais, "FOTOS ORDENADAS"),
-            (articulo, pais),
-            (color, articulo)
-        ]
-        
-        carpeta_actual_id = None
-        
-        for nombre_carpeta, padre in ruta_navegacion:
-            # Search for folder
-            parent_id = carpeta_actual_id if carpeta_actual_id else (
-                self.buscar_carpeta_por_nombre(padre) if padre else None
-            )
+        ruta = tuple(ruta)
+        inicio, carpeta_actual_id = 0, None
+        for nivel in range(len(ruta), 0, -1):
+            carpeta_id = self.folder_cache.obtener(ruta[:nivel])
+            if carpeta_id:
+                inicio, carpeta_actual_id = nivel, carpeta_id
+                break
+        
+        for nivel in range(inicio, len(ruta)):
+            nombre_carpeta = ruta[nivel]
+            carpeta_id = self.buscar_carpeta_por_nombre(nombre_carpeta, carpeta_actual_id)
             
-            carpeta_id = self.buscar_carpeta_por_nombre(nombre_carpeta, parent_id)
+            if not carpeta_id and crear:
+                # Only one thread creates a given path; the others wait and reuse its folder
+                with self.folder_cache.bloqueo_creacion(ruta[:nivel + 1]):
+                    carpeta_id = (self.folder_cache.obtener(ruta[:nivel + 1]) or
+                                  self.buscar_carpeta_por_nombre(nombre_carpeta, carpeta_actual_id))
+                    if not carpeta_id:
+                        print(f"   📁 Creando carpeta '{nombre_carpeta}'...")
+                        carpeta_id = self.crear_carpeta_drive(nombre_carpeta, carpeta_actual_id)
+                        if carpeta_id:
+                            self.folder_cache.guardar(ruta[:nivel + 1], carpeta_id)
             
-            # Create if doesn't exist
             if not carpeta_id:
-                print(f"   📁 Creando carpeta '{nombre_carpeta}'...")
-                carpeta_id = self.crear_carpeta_drive(nombre_carpeta, parent_id)
-                if not carpeta_id:
-                    print(f"   ❌ Error creando carpeta '{nombre_carpeta}'")
-                    return None
+                # A 404 on a cached ancestor invalidates it; resolve again from fresh IDs
+                if inicio and self.folder_cache.obtener(ruta[:inicio]) is None:
+                    return self.resolver_ruta(ruta, crear)
+                if not crear:
+                    raise FolderNotFoundError(nombre_carpeta, '/'.join(ruta[:nivel]) or None)
+                print(f"   ❌ Error creando carpeta '{nombre_carpeta}'")
+                return None
             
+            self.folder_cache.guardar(ruta[:nivel + 1], carpeta_id)
             carpeta_actual_id = carpeta_id
             print(f"   ✅ Carpeta '{nombre_carpeta}' encontrada/creada")
         
         return carpeta_actual_id
     
+    def navegar_y_crear_estructura(self, articulo: str, pais: str, color: str) -> str:
+        """
+        Navigate through LEBENGOOD/FOTOS/FOTOS ORDENADAS/{PAÍS}/{ARTÍCULO}/{COLOR}
+        and create any missing folders, returns the final folder ID
+        """
+        return self.resolver_ruta(RUTA_FOTOS_ORDENADAS + (pais, articulo, color), crear=True)
+    
     def subir_archivo(self, ruta_archivo: str, parent_folder_id: str = None) -> str:
         """Alias for subir_archivo_drive with automatic name extraction"""
         nombre_archivo = Path(ruta_archivo).name
         return self.subir_archivo_drive(ruta_archivo, nombre_archivo, parent_folder_id)
 
-    def listar_archivos_recursivo(self, folder_id: str) -> list:
-        """Recursively list all image files in a folder structure"""
-        if not self.service:
-            return []
-        
-        all_files = []
+    def _listar_hijos(self, parent_folder_ids: List[str]) -> list:
+        """List every non-trashed child of several folders in one query, following nextPageToken"""
+        padres = ' or '.join(f"'{parent_id}' in parents" for parent_id in parent_folder_ids)
+        query = f"({padres}) and trashed=false"
         
-        try:
-            # Get all items in current folder
-            query = f"'{folder_id}' in parents and trashed=false"
-            results = self.service.files().list(
+        items = []
+        page_token = None
+        while True:
+            results = self._ejecutar(self.service.files().list(
                 q=query,
-                fields="files(id, name, mimeType)"
-            ).execute()
-            
-            items = results.get('files', [])
+                fields="nextPageToken, files(id, name, mimeType)",
+                pageSize=LIST_PAGE_SIZE,
+                pageToken=page_token
+            ))
             
-            for item in items:
-                if item['mimeType'] == 'application/vnd.google-apps.folder':
-                    # Recursively search subfolders
-                    subfolder_files = self.listar_archivos_recursivo(item['id'])
-                    all_files.extend(subfolder_files)
-                elif 'image/' in item['mimeType']:
-                    # Add image files
-                    all_files.append(item)
+            items.extend(results.get('files', []))
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                return items
+    
+    def iterar_archivos_recursivo(self, folder_id: str, max_workers: int = LIST_WORKERS) -> Iterator[dict]:
+        """
+        Yield every image file below a folder, walking the tree level by level.
+        Each level is listed with queries that group up to LIST_PARENTS_PER_QUERY parents,
+        run concurrently, and files are yielded as soon as their query returns.
+        """
+        if not self.service:
+            return
+        
+        nivel = [folder_id]
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+            while nivel:
+                grupos = [
+                    nivel[i:i + LIST_PARENTS_PER_QUERY]
+                    for i in range(0, len(nivel), LIST_PARENTS_PER_QUERY)
+                ]
+                futuros = {executor.submit(self._listar_hijos, grupo): grupo for grupo in grupos}
+                
+                siguiente_nivel = []
+                for futuro in as_completed(futuros):
+                    try:
+                        items = futuro.result()
+                    except Exception as e:
+                        for parent_id in futuros[futuro]:
+                            self._invalidar_si_no_existe(e, parent_id)
+                        print(f"Error listing files recursively: {e}")
+                        continue
                     
-            return all_files
-            
-        except Exception as e:
-            print(f"Error listing files recursively: {e}")
-            return []
+                    for item in items:
+                        if item['mimeType'] == 'application/vnd.google-apps.folder':
+                            siguiente_nivel.append(item['id'])
+                        elif 'image/' in item['mimeType']:
+                            yield item
+                
+                nivel = siguiente_nivel
+    
+    def listar_archivos_recursivo(self, folder_id: str) -> list:
+        """Recursively list all image files in a folder structure"""
+        return list(self.iterar_archivos_recursivo(folder_id))
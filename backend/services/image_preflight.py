@@ -0,0 +1,88 @@
+"""
+Header-only image preflight: catches corrupt, truncated or mislabeled images before any processing
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, List, Sequence, Tuple
+
+try:
+    from PIL import Image, UnidentifiedImageError
+    PIL_DISPONIBLE = True
+except ImportError:
+    PIL_DISPONIBLE = False
+
+from utils.filename_rules import extension
+
+
+PREFLIGHT_WORKERS = int(os.getenv('PREFLIGHT_WORKERS', '8'))
+
+# Format PIL must report for each extension it can inspect; others (RAW, SVG) are not checked
+FORMATO_POR_EXTENSION = {
+    '.jpg': 'JPEG', '.jpeg': 'JPEG', '.jfif': 'JPEG', '.png': 'PNG', '.gif': 'GIF',
+    '.bmp': 'BMP', '.tiff': 'TIFF', '.webp': 'WEBP', '.ico': 'ICO',
+}
+
+# End-of-file markers; a missing marker means the upload was cut short
+MARCADORES_FIN = {
+    'PNG': b'IEND\xaeB`\x82',
+    'JPEG': b'\xff\xd9',
+}
+BYTES_COLA = 1024  # some encoders pad a few bytes after the end marker
+
+MODOS_CON_ALFA = {'RGBA', 'LA', 'PA', 'RGBa', 'La'}
+
+
+def inspeccionar(archivo: BinaryIO, nombre: str) -> dict:
+    """
+    Read only the header of an image (format, dimensions, mode, alpha) plus its last
+    bytes, without decoding pixels. Returns a per-file report with 'ok' and, on
+    failure, an 'error' explaining why.
+    """
+    reporte = {'name': nombre, 'ok': True, 'checked': False, 'error': None}
+    formato_esperado = FORMATO_POR_EXTENSION.get(extension(nombre))
+    if formato_esperado is None or not PIL_DISPONIBLE:
+        return reporte
+
+    reporte['checked'] = True
+    try:
+        archivo.seek(0)
+        with Image.open(archivo) as img:
+            reporte.update({
+                'format': img.format,
+                'width': img.width,
+                'height': img.height,
+                'mode': img.mode,
+                'has_alpha': img.mode in MODOS_CON_ALFA or 'transparency' in img.info,
+            })
+
+        if reporte['format'] != formato_esperado:
+            reporte.update(ok=False, error=f"La extensión indica {formato_esperado} pero el archivo es {reporte['format']}")
+            return reporte
+
+        if not reporte['width'] or not reporte['height']:
+            reporte.update(ok=False, error="Dimensiones inválidas")
+            return reporte
+
+        marcador = MARCADORES_FIN.get(reporte['format'])
+        if marcador:
+            archivo.seek(0, os.SEEK_END)
+            tamano = archivo.tell()
+            archivo.seek(max(0, tamano - BYTES_COLA))
+            if marcador not in archivo.read():
+                reporte.update(ok=False, error="Archivo truncado (falta el marcador de fin)")
+    except UnidentifiedImageError:
+        reporte.update(ok=False, error="Imagen dañada o ilegible: formato no reconocido")
+    except (Image.DecompressionBombError, OSError, ValueError, SyntaxError) as e:
+        reporte.update(ok=False, error=f"Imagen dañada o ilegible: {e}")
+    finally:
+        archivo.seek(0)
+
+    return reporte
+
+
+def inspeccionar_lote(archivos: Sequence[Tuple[str, BinaryIO]], workers: int = PREFLIGHT_WORKERS) -> List[dict]:
+    """Inspect several (name, file object) pairs in parallel; reports come back in input order"""
+    if not archivos:
+        return []
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(archivos)))) as executor:
+        return list(executor.map(lambda par: inspeccionar(par[1], par[0]), archivos))
@@ -0,0 +1,187 @@
+"""
+SQLite journal of background jobs and the files they upload, so a restart can resume them
+"""
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Dict, List, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from jobs import models
+from jobs.database import SessionLocal
+
+# Item states
+PENDIENTE = 'pending'
+SUBIDO = 'uploaded'
+
+
+class JobJournal:
+    """
+    Persists each job's state and one row per staged file with its target name,
+    destination folder, checksum and, once uploaded, its Drive file ID. Write errors are
+    reported and ignored: the journal must never make a batch fail.
+    Every write is queued to one writer thread and returns a Future right away, so
+    neither the event loop nor the upload threads ever wait on an SQLite lock.
+    """
+
+    def __init__(self, sesiones=SessionLocal):
+        self._sesiones = sesiones
+        self._cola = queue.Queue()
+        self._escritor = None
+        self._lock = threading.Lock()
+
+    def guardar_job(self, job: dict) -> Future:
+        """Insert or update a job's row from a snapshot of its in-memory state"""
+        fila = {
+            'id': job['id'],
+            'type': job['type'],
+            'username': job['user'],
+            'status': job['status'],
+            'parameters': json.dumps(job['parameters']),
+            'folders': json.dumps(job['folders']),
+            'result': json.dumps(job['result']) if job['result'] is not None else None,
+            'error': job['error'],
+            'created_at': job['created_at'],
+            'started_at': job['started_at'],
+            'finished_at': job['finished_at'],
+        }
+        return self._encolar(self._guardar_fila, fila)
+
+    def esperar(self):
+        """Block until every queued write has been committed; for shutdown"""
+        self._cola.join()
+
+    def _encolar(self, funcion, *args) -> Future:
+        futuro = Future()
+        with self._lock:
+            if self._escritor is None:
+                self._escritor = threading.Thread(target=self._escribir, name='job-journal', daemon=True)
+                self._escritor.start()
+        self._cola.put((futuro, funcion, args))
+        return futuro
+
+    def _escribir(self):
+        """Writer thread: apply queued writes one at a time, in order"""
+        while True:
+            futuro, funcion, args = self._cola.get()
+            try:
+                futuro.set_result(funcion(*args))
+            except BaseException as e:
+                futuro.set_exception(e)
+            finally:
+                self._cola.task_done()
+
+    def _guardar_fila(self, fila: dict):
+        try:
+            with self._sesiones() as db:
+                db.merge(models.Job(**fila))
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo guardar el job {fila['id']} en el journal: {e}")
+
+    def cargar_jobs(self, desde: float) -> List[dict]:
+        """Unfinished jobs plus those finished after desde, as in-memory job dicts"""
+        try:
+            with self._sesiones() as db:
+                filas = db.query(models.Job).filter(
+                    (models.Job.finished_at.is_(None)) | (models.Job.finished_at >= desde)
+                ).all()
+                return [{
+                    'id': fila.id,
+                    'type': fila.type,
+                    'user': fila.username,
+                    'status': fila.status,
+                    'created_at': fila.created_at,
+                    'started_at': fila.started_at,
+                    'finished_at': fila.finished_at,
+                    'parameters': json.loads(fila.parameters or '{}'),
+                    'folders': json.loads(fila.folders or '{}'),
+                    'result': json.loads(fila.result) if fila.result else None,
+                    'error': fila.error,
+                } for fila in filas]
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo leer el journal de jobs: {e}")
+            return []
+
+    def registrar_pendiente(self, job_id: str, destino_id: str, nombre: str, origen: str, checksum: str = None) -> Future:
+        """Record a staged file about to be uploaded as nombre into destino_id"""
+        return self._encolar(self._registrar_pendiente, job_id, destino_id, nombre, origen, checksum)
+
+    def _registrar_pendiente(self, job_id: str, destino_id: str, nombre: str, origen: str, checksum: str):
+        try:
+            with self._sesiones() as db:
+                item = self._item(db, job_id, destino_id, nombre)
+                if item is None:
+                    item = models.JobItem(job_id=job_id, destination_folder_id=destino_id, target_name=nombre)
+                    db.add(item)
+                item.staged_path = origen
+                item.checksum = checksum
+                item.file_id = None
+                item.status = PENDIENTE
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo registrar {nombre} en el journal: {e}")
+
+    def marcar_subido(self, job_id: str, destino_id: str, nombre: str, file_id: str, checksum: str = None) -> Future:
+        """Record that nombre reached Drive as file_id"""
+        return self._encolar(self._marcar_subido, job_id, destino_id, nombre, file_id, checksum)
+
+    def _marcar_subido(self, job_id: str, destino_id: str, nombre: str, file_id: str, checksum: str):
+        try:
+            with self._sesiones() as db:
+                item = self._item(db, job_id, destino_id, nombre)
+                if item is None:
+                    item = models.JobItem(job_id=job_id, destination_folder_id=destino_id, target_name=nombre)
+                    db.add(item)
+                if checksum:
+                    item.checksum = checksum
+                item.file_id = file_id
+                item.status = SUBIDO
+                db.commit()
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo marcar {nombre} como subido en el journal: {e}")
+
+    def subidas_completadas(self, job_id: str, destino_id: str) -> Dict[str, Tuple[str, str]]:
+        """{target name: (checksum, file ID)} of the files of a job already uploaded to destino_id"""
+        try:
+            with self._sesiones() as db:
+                filas = db.query(models.JobItem).filter(
+                    models.JobItem.job_id == job_id,
+                    models.JobItem.destination_folder_id == destino_id,
+                    models.JobItem.status == SUBIDO
+                ).all()
+                return {fila.target_name: (fila.checksum, fila.file_id) for fila in filas}
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo leer el journal de jobs: {e}")
+            return {}
+
+    def purgar(self, hasta: float) -> Future:
+        """Delete jobs finished before hasta together with their items"""
+        return self._encolar(self._purgar, hasta)
+
+    def _purgar(self, hasta: float):
+        try:
+            with self._sesiones() as db:
+                antiguos = [
+                    fila.id for fila in db.query(models.Job.id).filter(models.Job.finished_at < hasta)
+                ]
+                if antiguos:
+                    db.query(models.JobItem).filter(models.JobItem.job_id.in_(antiguos)).delete(synchronize_session=False)
+                    db.query(models.Job).filter(models.Job.id.in_(antiguos)).delete(synchronize_session=False)
+                    db.commit()
+        except SQLAlchemyError as e:
+            print(f"⚠️ No se pudo purgar el journal de jobs: {e}")
+
+    @staticmethod
+    def _item(db, job_id: str, destino_id: str, nombre: str):
+        return db.query(models.JobItem).filter(
+            models.JobItem.job_id == job_id,
+            models.JobItem.destination_folder_id == destino_id,
+            models.JobItem.target_name == nombre
+        ).first()
+
+
+# Shared by the job manager and every FileProcessor working for a job
+job_journal = JobJournal()
@@ -0,0 +1,206 @@
+"""
+Background jobs: long batches run after the request returns, tracked by job ID
+"""
+import asyncio
+import os
+import shutil
+import time
+import uuid
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from services.job_journal import job_journal
+from services.ws_manager import canales_actuales, canal_job, canal_usuario
+
+
+JOBS_DIR = os.getenv('JOBS_DIR', 'job_data')
+# Jobs running at the same time; the rest wait in the queue
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+# How long finished jobs stay queryable
+JOB_RETENTION_SECONDS = int(os.getenv('JOB_RETENTION_SECONDS', '3600'))
+
+# Written in a job's directory once its whole batch has been saved; resuming needs it
+MARCA_LOTE_GUARDADO = '.lote_guardado'
+
+# Job states
+EN_COLA = 'queued'
+EN_CURSO = 'running'
+COMPLETADO = 'completed'
+FALLIDO = 'failed'
+
+
+class JobManager:
+    """
+    Keeps the state of background jobs and runs them on the event loop, at most
+    workers at a time. Each job gets a directory below JOBS_DIR where its request
+    persists the uploaded batch; the directory is removed when the job finishes.
+    Every state change is queued to the job journal's writer thread, so the event loop
+    never waits on SQLite, and reanudar() relaunches the
+    jobs a previous process left unfinished through the factory registered for their
+    type. A job created with persistir=False stays out of the journal until
+    confirmar(), so a request can save its batch first and never leave behind a job
+    that points at a partial one.
+    """
+
+    def __init__(self, directorio: str = JOBS_DIR, workers: int = JOB_WORKERS,
+                 retencion: int = JOB_RETENTION_SECONDS):
+        self.directorio = Path(directorio)
+        self.workers = max(1, workers)
+        self.retencion = retencion
+        self._jobs: Dict[str, dict] = {}
+        self._tareas = set()
+        self._semaforo = None
+        self._reanudaciones: Dict[str, Callable[[dict], Optional[Callable[[str], Awaitable[dict]]]]] = {}
+
+    def crear(self, tipo: str, carpetas: Iterable[str] = (), parametros: dict = None, usuario: str = None,
+              persistir: bool = True) -> dict:
+        """Register a queued job of usuario with one progress entry per folder"""
+        self._purgar()
+        job_id = uuid.uuid4().hex
+        job = {
+            'id': job_id,
+            'type': tipo,
+            'user': usuario,
+            'status': EN_COLA,
+            'created_at': time.time(),
+            'started_at': None,
+            'finished_at': None,
+            'parameters': parametros or {},
+            'folders': {nombre: {'status': 'pending', 'stage': None, 'result': None} for nombre in carpetas},
+            'result': None,
+            'error': None,
+        }
+        self._jobs[job_id] = job
+        if persistir:
+            job_journal.guardar_job(job)
+        return job
+
+    async def confirmar(self, job_id: str):
+        """Mark a job's batch as fully saved and wait until the job is in the journal"""
+        await asyncio.to_thread((self.directorio / job_id / MARCA_LOTE_GUARDADO).touch)
+        await asyncio.wrap_future(job_journal.guardar_job(self._jobs[job_id]))
+
+    def descartar(self, job_id: str):
+        """Forget a job that was never confirmed, together with whatever it had saved"""
+        self._jobs.pop(job_id, None)
+        shutil.rmtree(self.directorio / job_id, True)
+
+    def lote_guardado(self, job_id: str) -> bool:
+        """Whether a job's batch was saved completely before it was queued"""
+        return (self.directorio / job_id / MARCA_LOTE_GUARDADO).is_file()
+
+    def obtener(self, job_id: str) -> Optional[dict]:
+        """Snapshot of a job's state, or None if unknown or expired"""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {
+            **job,
+            'folders': [{'name': nombre, **progreso} for nombre, progreso in job['folders'].items()]
+        }
+
+    def directorio_de(self, job_id: str) -> Path:
+        """Directory where a job's uploaded files are persisted until it finishes"""
+        ruta = self.directorio / job_id
+        ruta.mkdir(parents=True, exist_ok=True)
+        return ruta
+
+    def actualizar_carpeta(self, job_id: str, nombre: str, **campos):
+        """Update the progress entry of one folder of a job"""
+        job = self._jobs.get(job_id)
+        if job is not None:
+            job['folders'].setdefault(nombre, {'status': 'pending', 'stage': None, 'result': None}).update(campos)
+            job_journal.guardar_job(job)
+
+    def lanzar(self, job_id: str, trabajo: Callable[[str], Awaitable[dict]]):
+        """
+        Schedule trabajo(job_id) on the running event loop. Its return value becomes the
+        job result; an exception marks the job as failed.
+        """
+        if self._semaforo is None:
+            self._semaforo = asyncio.Semaphore(self.workers)
+        tarea = asyncio.get_running_loop().create_task(self._ejecutar(job_id, trabajo))
+        self._tareas.add(tarea)
+        tarea.add_done_callback(self._tareas.discard)
+
+    async def _ejecutar(self, job_id: str, trabajo: Callable[[str], Awaitable[dict]]):
+        job = self._jobs[job_id]
+        # The job logs to its own channel and its user's, also after a restart
+        canales_actuales.set(tuple(
+            ([canal_usuario(job['user'])] if job['user'] else []) + [canal_job(job_id)]
+        ))
+        async with self._semaforo:
+            job.update(status=EN_CURSO, started_at=time.time())
+            job_journal.guardar_job(job)
+            try:
+                job['result'] = await trabajo(job_id)
+                job['status'] = COMPLETADO
+            except asyncio.CancelledError:
+                # Shutdown: the job stays running in the journal with its staged files,
+                # so the next process resumes it
+                job_journal.guardar_job(job)
+                raise
+            except Exception as e:
+                print(f"❌ Job {job_id} fallido: {e}")
+                job.update(status=FALLIDO, error=getattr(e, 'message', str(e)))
+            job['finished_at'] = time.time()
+            job_journal.guardar_job(job)
+            await asyncio.to_thread(shutil.rmtree, self.directorio / job_id, True)
+
+    async def detener(self):
+        """Cancel the running jobs and wait for them, leaving them to be resumed; for shutdown"""
+        tareas = list(self._tareas)
+        for tarea in tareas:
+            tarea.cancel()
+        await asyncio.gather(*tareas, return_exceptions=True)
+
+    def registrar_reanudacion(self, tipo: str, fabrica: Callable[[dict], Optional[Callable[[str], Awaitable[dict]]]]):
+        """
+        Register how to resume jobs of a type: fabrica(job) returns the trabajo to pass to
+        lanzar, or None when the job cannot be resumed
+        """
+        self._reanudaciones[tipo] = fabrica
+
+    def reanudar(self):
+        """
+        Load the journaled jobs and relaunch the ones left queued or running by a
+        previous process. Call from the event loop once every type is registered.
+        """
+        jobs = job_journal.cargar_jobs(time.time() - self.retencion)
+        
+        # Directories of jobs that were never confirmed or already finished are leftovers
+        activos = {job['id'] for job in jobs if job['status'] in (EN_COLA, EN_CURSO)}
+        if self.directorio.is_dir():
+            for directorio in self.directorio.iterdir():
+                if directorio.is_dir() and directorio.name not in activos:
+                    shutil.rmtree(directorio, True)
+        
+        for job in jobs:
+            self._jobs.setdefault(job['id'], job)
+            if job['status'] not in (EN_COLA, EN_CURSO):
+                continue
+            
+            fabrica = self._reanudaciones.get(job['type'])
+            trabajo = fabrica(job) if fabrica else None
+            if trabajo is None:
+                job.update(status=FALLIDO, error="No se pudo reanudar tras el reinicio", finished_at=time.time())
+                job_journal.guardar_job(job)
+                continue
+            
+            print(f"🔁 Reanudando job {job['id']} ({job['type']})")
+            job['status'] = EN_COLA
+            self.lanzar(job['id'], trabajo)
+
+    def _purgar(self):
+        """Forget finished jobs older than the retention period"""
+        limite = time.time() - self.retencion
+        job_journal.purgar(limite)
+        for job_id in [
+            job_id for job_id, job in self._jobs.items()
+            if job['finished_at'] and job['finished_at'] < limite
+        ]:
+            del self._jobs[job_id]
+
+
+# Shared by every route that can run in the background
+job_manager = JobManager()
@@ -0,0 +1,62 @@
+"""
+Thread-safe bridge from worker-thread log callbacks to WebSocket clients on the event loop
+"""
+import asyncio
+import os
+import threading
+from typing import List, Tuple
+
+from services.ws_manager import ws_manager, canales_actuales
+
+
+# Seconds a burst of log lines is collected before being sent as one frame
+LOG_FLUSH_INTERVAL = float(os.getenv('LOG_FLUSH_INTERVAL', '0.1'))
+# Lines per frame at most; larger bursts are split across frames
+LOG_MAX_BATCH = int(os.getenv('LOG_MAX_BATCH', '100'))
+
+
+class LogBridge:
+    """
+    Log callback for code running in worker threads. Each call prints the line and
+    appends it to a buffer; the first line of a burst schedules, with
+    loop.call_soon_threadsafe, a flush on the event loop intervalo seconds later, which
+    sends everything buffered meanwhile as newline-separated frames. Hundreds of
+    upload threads logging at once thus cost one cross-thread wakeup per interval and
+    a handful of frames. Messages go to the channels current when the bridge is built.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, canales: Tuple[str, ...] = None,
+                 intervalo: float = LOG_FLUSH_INTERVAL, max_lineas: int = LOG_MAX_BATCH):
+        self.loop = loop
+        self.canales = canales_actuales.get() if canales is None else canales
+        self.intervalo = max(0.0, intervalo)
+        self.max_lineas = max(1, max_lineas)
+        self._lineas: List[str] = []
+        self._programado = False
+        self._lock = threading.Lock()
+
+    def __call__(self, message: str):
+        print(message)
+        with self._lock:
+            self._lineas.append(message)
+            if self._programado:
+                return
+            self._programado = True
+        try:
+            self.loop.call_soon_threadsafe(self._programar)
+        except RuntimeError:
+            # The loop is closed; the line has been printed, drop the rest
+            with self._lock:
+                self._lineas.clear()
+                self._programado = False
+
+    def _programar(self):
+        self.loop.call_later(self.intervalo, self.vaciar)
+
+    def vaciar(self):
+        """Send the buffered lines now; call from the event loop, e.g. before a summary"""
+        with self._lock:
+            lineas, self._lineas = self._lineas, []
+            self._programado = False
+        for inicio in range(0, len(lineas), self.max_lineas):
+            ws_manager.difundir('\n'.join(lineas[inicio:inicio + self.max_lineas]), self.canales)
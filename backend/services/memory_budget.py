@@ -0,0 +1,41 @@
+"""
+Process-wide memory budget for image conversions
+"""
+import os
+import threading
+
+
+CONVERSION_MEMORY_BUDGET_MB = int(os.getenv('CONVERSION_MEMORY_BUDGET_MB', '256'))
+
+
+class MemoryBudget:
+    """
+    Counts the estimated bytes of conversions in flight. A reservation waits until it
+    fits in the budget; one that is larger than the whole budget runs alone, so a huge
+    image is slow rather than impossible.
+    """
+
+    def __init__(self, total_mb: int = CONVERSION_MEMORY_BUDGET_MB):
+        self.total = total_mb * 1024 * 1024
+        self._en_uso = 0
+        self._cond = threading.Condition()
+
+    def reservar(self, costo: int, esperar: bool = True) -> bool:
+        """Reserve costo bytes; without esperar, return False instead of blocking"""
+        with self._cond:
+            while self._en_uso and self._en_uso + costo > self.total:
+                if not esperar:
+                    return False
+                self._cond.wait()
+            self._en_uso += costo
+            return True
+
+    def liberar(self, costo: int):
+        """Return the bytes of a finished conversion to the budget"""
+        with self._cond:
+            self._en_uso = max(0, self._en_uso - costo)
+            self._cond.notify_all()
+
+
+# Shared by every folder converted in this server process
+memory_budget = MemoryBudget()
@@ -0,0 +1,80 @@
+"""
+Photo gathering service: packs the images of a Drive folder into a ZIP on Drive
+"""
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Iterator, Tuple
+
+
+DOWNLOAD_WORKERS = int(os.getenv('DOWNLOAD_WORKERS', '6'))
+
+
+class PhotoGatherer:
+    """Downloads images concurrently and streams them into a ZIP uploaded to Drive"""
+
+    def __init__(self, google_drive_service, download_workers: int = DOWNLOAD_WORKERS):
+        """Initialize with Google Drive service and the number of concurrent downloads"""
+        self.drive_service = google_drive_service
+        self.download_workers = max(1, download_workers)
+
+    def descargar_fotos(self, carpeta_id: str) -> Iterator[Tuple[str, bytes]]:
+        """
+        Yield (name, content) for every image below a folder as each download completes,
+        with content None when the download failed. Downloads start while the folder tree
+        is still being listed; at most twice download_workers files are held in memory.
+        Repeated names are skipped.
+        """
+        max_en_vuelo = self.download_workers * 2
+        nombres_vistos = set()
+        pendientes = set()
+
+        def descargar(archivo: dict):
+            return archivo['name'], self.drive_service.descargar_a_memoria(archivo['id'], archivo['name'])
+
+        def completados(hechos):
+            for futuro in hechos:
+                yield futuro.result()
+
+        with ThreadPoolExecutor(max_workers=self.download_workers) as executor:
+            for archivo in self.drive_service.iterar_archivos_recursivo(carpeta_id):
+                if archivo['name'] in nombres_vistos:
+                    continue
+                nombres_vistos.add(archivo['name'])
+                pendientes.add(executor.submit(descargar, archivo))
+
+                if len(pendientes) >= max_en_vuelo:
+                    hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    yield from completados(hechos)
+
+            while pendientes:
+                hechos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                yield from completados(hechos)
+
+    def subir_zip(self, carpeta_id: str, nombre_zip: str, log=print) -> Tuple[int, int, str]:
+        """
+        Download every image below a folder and stream it into a ZIP uploaded to the
+        same folder; nothing is written to disk. The upload only starts once the first
+        image has been downloaded. Returns (images found, images zipped, ZIP file ID).
+        """
+        contador = {'encontradas': 0, 'descargadas': 0}
+
+        def descargadas_ok():
+            for nombre, contenido in self.descargar_fotos(carpeta_id):
+                contador['encontradas'] += 1
+                if contenido is None:
+                    log(f"❌ Error descargando {nombre}")
+                    continue
+                contador['descargadas'] += 1
+                log(f"⬇️ Descargada [{contador['descargadas']}]: {nombre}")
+                yield nombre, contenido
+
+        entradas = descargadas_ok()
+        primera = next(entradas, None)
+        if primera is None:
+            return contador['encontradas'], 0, None
+
+        zip_id, _ = self.drive_service.subir_zip_en_streaming(
+            itertools.chain([primera], entradas), nombre_zip, carpeta_id
+        )
+        return contador['encontradas'], contador['descargadas'], zip_id
@@ -0,0 +1,165 @@
+"""
+Staged pipeline for /rename/process: save → convert → upload → archive
+"""
+import asyncio
+import os
+import queue
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Awaitable, Callable, List, Sequence, Tuple
+
+from services.file_processor import FileProcessor, PERFIL_JPEG_POR_DEFECTO
+
+
+# Folders allowed to wait between two stages; bounds the disk used by saved folders
+PIPELINE_QUEUE_SIZE = int(os.getenv('PIPELINE_QUEUE_SIZE', '2'))
+# Folders each stage works on at the same time
+FOLDER_CONCURRENCY = int(os.getenv('FOLDER_CONCURRENCY', '4'))
+
+
+class RenamePipeline:
+    """
+    Runs folders through save, convert, upload and archive stages connected by bounded
+    queues, so one folder can be uploading while the next one converts and a third is
+    being saved. Each stage works on up to concurrencia folders at a time; the
+    conversion stage hands files to the upload stage one by one as they are ready, so a
+    folder's uploads start before its conversion ends. Log lines are prefixed with the
+    folder name so every folder keeps its own readable progress stream.
+    """
+
+    def __init__(self, processor: FileProcessor, articulo: str, lista_codigos: List[str], log=print,
+                 copia_servidor: bool = False, perfil_jpeg: str = PERFIL_JPEG_POR_DEFECTO,
+                 tamano_cola: int = PIPELINE_QUEUE_SIZE, concurrencia: int = FOLDER_CONCURRENCY,
+                 job_id: str = None):
+        self.processor = processor
+        self.articulo = articulo
+        self.lista_codigos = lista_codigos
+        self.log = log
+        self.copia_servidor = copia_servidor
+        self.perfil_jpeg = perfil_jpeg
+        self.tamano_cola = max(1, tamano_cola)
+        self.concurrencia = max(1, concurrencia)
+        self.job_id = job_id
+
+    async def ejecutar(
+        self,
+        carpetas: Sequence[Tuple[str, object]],
+        guardar: Callable[[int, str, object, Path], Awaitable[Path]],
+        al_terminar: Callable[[int, dict], Awaitable[None]] = None,
+        al_avanzar: Callable[[int, str], Awaitable[None]] = None
+    ) -> List[dict]:
+        """
+        Process (name, content) folders. guardar(index, name, content, work_dir) writes one
+        folder to disk below work_dir and returns its path; al_terminar(index, result) is
+        awaited as each folder finishes and al_avanzar(index, stage) as it enters each of
+        the 'saving', 'converting', 'uploading' and 'archiving' stages. Returns the
+        per-folder results in input order.
+        """
+        resultados = [None] * len(carpetas)
+        cola_convertir = asyncio.Queue(maxsize=self.tamano_cola)
+        cola_subir = asyncio.Queue(maxsize=self.tamano_cola)
+        cola_archivar = asyncio.Queue(maxsize=self.tamano_cola)
+
+        async def terminar(indice: int, carpeta_trabajo: Path, resultado: dict):
+            resultados[indice] = resultado
+            await asyncio.to_thread(shutil.rmtree, carpeta_trabajo, True)
+            if al_terminar:
+                await al_terminar(indice, resultado)
+
+        async def avanzar(indice: int, etapa: str):
+            if al_avanzar:
+                await al_avanzar(indice, etapa)
+
+        def fallo(nombre: str, error: Exception) -> dict:
+            return {'carpeta': nombre, 'exito': False, 'error': str(error)}
+
+        pendientes = iter(enumerate(carpetas))
+
+        async def guardar_siguientes():
+            for indice, (nombre, contenido) in pendientes:
+                carpeta_trabajo = Path(tempfile.mkdtemp())
+                await avanzar(indice, 'saving')
+                try:
+                    ruta = await guardar(indice, nombre, contenido, carpeta_trabajo)
+                except Exception as e:
+                    await terminar(indice, carpeta_trabajo, fallo(nombre, e))
+                    continue
+                await cola_convertir.put((indice, nombre, carpeta_trabajo, ruta))
+
+        async def convertir_siguientes():
+            while (elemento := await cola_convertir.get()) is not None:
+                indice, nombre, carpeta_trabajo, ruta = elemento
+                log = self._log_de(nombre)
+                await avanzar(indice, 'converting')
+                try:
+                    trabajo = await asyncio.to_thread(
+                        self.processor.preparar_carpeta, str(ruta), self.articulo, self.lista_codigos,
+                        carpeta_trabajo, log, self.copia_servidor, self.perfil_jpeg, self.job_id
+                    )
+                except Exception as e:
+                    trabajo = fallo(nombre, e)
+                if not trabajo['exito']:
+                    await terminar(indice, carpeta_trabajo, trabajo)
+                    continue
+
+                canal = queue.Queue()
+                await cola_subir.put((indice, carpeta_trabajo, trabajo, canal))
+                await asyncio.to_thread(self._convertir, trabajo, canal, log)
+
+        async def subir_siguientes():
+            while (elemento := await cola_subir.get()) is not None:
+                indice, carpeta_trabajo, trabajo, canal = elemento
+                await avanzar(indice, 'uploading')
+                try:
+                    await asyncio.to_thread(
+                        self.processor.subir_carpeta, trabajo, iter(canal.get, None),
+                        self._log_de(trabajo['carpeta'])
+                    )
+                except Exception as e:
+                    await terminar(indice, carpeta_trabajo, fallo(trabajo['carpeta'], e))
+                    continue
+                await cola_archivar.put((indice, carpeta_trabajo, trabajo))
+
+        async def archivar_siguientes():
+            while (elemento := await cola_archivar.get()) is not None:
+                indice, carpeta_trabajo, trabajo = elemento
+                await avanzar(indice, 'archiving')
+                try:
+                    resultado = await asyncio.to_thread(
+                        self.processor.archivar_carpeta, trabajo, self._log_de(trabajo['carpeta'])
+                    )
+                except Exception as e:
+                    resultado = fallo(trabajo['carpeta'], e)
+                await terminar(indice, carpeta_trabajo, resultado)
+
+        async def etapa(trabajador, cola_siguiente: asyncio.Queue = None):
+            """Run concurrencia workers of a stage, then tell every worker of the next one to stop"""
+            await asyncio.gather(*(trabajador() for _ in range(self.concurrencia)))
+            if cola_siguiente is not None:
+                for _ in range(self.concurrencia):
+                    await cola_siguiente.put(None)
+
+        await asyncio.gather(
+            etapa(guardar_siguientes, cola_convertir),
+            etapa(convertir_siguientes, cola_subir),
+            etapa(subir_siguientes, cola_archivar),
+            etapa(archivar_siguientes)
+        )
+        return resultados
+
+    def _log_de(self, nombre: str):
+        """Log callback that prefixes every line with the folder it belongs to"""
+        def log(message: str):
+            self.log(f"   [{nombre}] {message.strip()}")
+        return log
+
+    def _convertir(self, trabajo: dict, canal: queue.Queue, log=print):
+        """Feed the folder's plan entries to the upload stage, closing the channel with None"""
+        try:
+            for entrada in self.processor.convertir_carpeta(trabajo):
+                canal.put(entrada)
+        except Exception as e:
+            log(f"❌ Error convirtiendo: {e}")
+        finally:
+            canal.put(None)
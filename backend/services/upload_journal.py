@@ -0,0 +1,112 @@
+"""
+Local journal of in-progress resumable Drive uploads
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Iterable, Tuple, Union
+
+from utils.helpers import calcular_md5
+
+
+UPLOAD_JOURNAL_FILE = os.getenv('UPLOAD_JOURNAL_FILE', 'upload_journal.json')
+SESSION_MAX_AGE = 6 * 24 * 3600  # Drive expires resumable sessions after a week
+
+
+class UploadJournal:
+    """
+    Records the session URI and last acknowledged offset of each resumable upload,
+    so a retry or a restarted worker continues from that byte instead of byte 0
+    """
+
+    def __init__(self, ruta: str = UPLOAD_JOURNAL_FILE):
+        self.ruta = Path(ruta)
+        self._lock = threading.Lock()
+        self._sesiones = self._cargar()
+
+    @staticmethod
+    def clave(ruta_archivo: str, nombre_archivo: str, parent_folder_id: str = None, destino: str = None,
+              md5: str = None) -> str:
+        """
+        Identify an upload by the local file's content (size and MD5, computed here when
+        not given) and its Drive target. Converted files are staged in a new temporary
+        directory on every run, so their path and mtime cannot identify them.
+        """
+        datos = '|'.join([
+            str(os.path.getsize(ruta_archivo)), md5 or calcular_md5(ruta_archivo),
+            nombre_archivo, parent_folder_id or '', destino or ''
+        ])
+        return hashlib.sha1(datos.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def clave_zip(entradas: Iterable[Tuple[str, Union[Path, str, bytes]]], nombre_zip: str,
+                  parent_folder_id: str = None, destino: str = None) -> str:
+        """
+        Identify a streamed ZIP upload by the name and content of its entries and its
+        Drive target, so a rebuilt archive matches the one whose upload was interrupted
+        """
+        sha = hashlib.sha1()
+        # Deflate output may change between zlib versions
+        for parte in (zlib.ZLIB_RUNTIME_VERSION, nombre_zip, parent_folder_id or '', destino or ''):
+            sha.update(parte.encode('utf-8') + b'\0')
+        for nombre, origen in entradas:
+            if isinstance(origen, (bytes, bytearray)):
+                md5 = hashlib.md5(origen).hexdigest()
+            else:
+                md5 = calcular_md5(origen)
+            sha.update(f"{nombre}|{md5}".encode('utf-8') + b'\0')
+        return sha.hexdigest()
+
+    def obtener(self, clave: str) -> dict:
+        """Return {'uri', 'progreso', 'tamano'} plus any extra fields for a pending upload, or None"""
+        with self._lock:
+            sesion = self._sesiones.get(clave)
+            return dict(sesion) if sesion else None
+
+    def guardar(self, clave: str, uri: str, progreso: int, tamano: int, extra: dict = None):
+        """
+        Record the session URI and the last byte offset acknowledged by Drive, plus
+        extra fields needed to rebuild the upload's content
+        """
+        with self._lock:
+            self._sesiones[clave] = {
+                **(extra or {}),
+                'uri': uri,
+                'progreso': progreso,
+                'tamano': tamano,
+                'actualizado': time.time()
+            }
+            self._escribir()
+
+    def eliminar(self, clave: str):
+        """Forget an upload once it has finished or its session is gone"""
+        with self._lock:
+            if self._sesiones.pop(clave, None) is not None:
+                self._escribir()
+
+    def _cargar(self) -> dict:
+        try:
+            sesiones = json.loads(self.ruta.read_text())
+        except (OSError, ValueError):
+            return {}
+        limite = time.time() - SESSION_MAX_AGE
+        return {
+            clave: sesion for clave, sesion in sesiones.items()
+            if sesion.get('actualizado', 0) > limite
+        }
+
+    def _escribir(self):
+        temporal = self.ruta.with_name(self.ruta.name + '.tmp')
+        try:
+            temporal.write_text(json.dumps(self._sesiones))
+            os.replace(temporal, self.ruta)
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar el journal de subidas: {e}")
+
+
+# Shared by every GoogleDriveService instance
+upload_journal = UploadJournal()
@@ -0,0 +1,129 @@
+"""
+WebSocket fan-out: every client gets its own bounded send queue and sender task, and
+only receives the channels (its user, the jobs it follows) it is subscribed to
+"""
+import asyncio
+import os
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Iterable, Set, Tuple
+
+from fastapi import WebSocket
+
+
+# Messages a client may fall behind by before the oldest ones are dropped
+WS_QUEUE_SIZE = int(os.getenv('WS_QUEUE_SIZE', '500'))
+
+# Channels the messages logged by the current request or job are sent to. Set once per
+# request (its user) and per job (its user and the job); tasks and worker threads
+# started from there inherit it.
+canales_actuales: ContextVar[Tuple[str, ...]] = ContextVar('canales_ws', default=())
+
+
+def canal_usuario(username: str) -> str:
+    return f"user:{username}"
+
+
+def canal_job(job_id: str) -> str:
+    return f"job:{job_id}"
+
+
+class ClienteWs:
+    """One connected socket with its outbound queue"""
+
+    def __init__(self, websocket: WebSocket, tamano_cola: int, canales: Iterable[str] = ()):
+        self.websocket = websocket
+        self.canales = set(canales)
+        self.cola = deque(maxlen=tamano_cola)
+        self.pendiente = asyncio.Event()
+        self.descartados = 0
+        self.tarea = None
+
+    def encolar(self, mensaje: str):
+        """Queue a message without waiting; when full, the oldest one is dropped"""
+        if len(self.cola) == self.cola.maxlen:
+            self.descartados += 1
+        self.cola.append(mensaje)
+        self.pendiente.set()
+
+
+class ConnectionManager:
+    """
+    Tracks the connected WebSocket clients. Broadcasting only appends to each client's
+    queue and never awaits a socket, so a slow client cannot hold back the code that
+    logs; each client's sender task delivers its queue at the pace the client reads.
+    A client that falls more than tamano_cola messages behind loses the oldest ones
+    and is told how many. Sockets whose send fails are closed and removed.
+    Messages go to the clients subscribed to the channels in canales_actuales, so a
+    client only receives its own user's and jobs' traffic.
+    """
+
+    def __init__(self, tamano_cola: int = WS_QUEUE_SIZE):
+        self.tamano_cola = max(1, tamano_cola)
+        self._clientes: Dict[WebSocket, ClienteWs] = {}
+        self._canales: Dict[str, Set[ClienteWs]] = {}
+
+    def __len__(self) -> int:
+        return len(self._clientes)
+
+    async def conectar(self, websocket: WebSocket, canales: Iterable[str] = ()) -> ClienteWs:
+        """Accept a socket subscribed to canales and start its sender task"""
+        await websocket.accept()
+        cliente = ClienteWs(websocket, self.tamano_cola, canales)
+        cliente.tarea = asyncio.get_running_loop().create_task(self._enviar(cliente))
+        self._clientes[websocket] = cliente
+        for canal in cliente.canales:
+            self._canales.setdefault(canal, set()).add(cliente)
+        return cliente
+
+    async def desconectar(self, websocket: WebSocket):
+        """Forget a socket and stop its sender task"""
+        cliente = self._clientes.pop(websocket, None)
+        if cliente is None:
+            return
+        for canal in cliente.canales:
+            suscritos = self._canales.get(canal)
+            if suscritos is not None:
+                suscritos.discard(cliente)
+                if not suscritos:
+                    del self._canales[canal]
+        if cliente.tarea is not asyncio.current_task():
+            cliente.tarea.cancel()
+        try:
+            await websocket.close()
+        except Exception:
+            pass  # already closed by the client
+
+    def difundir(self, mensaje: str, canales: Tuple[str, ...] = None):
+        """Queue a message for the clients of canales (default: canales_actuales); no channel, no clients"""
+        if canales is None:
+            canales = canales_actuales.get()
+        if not canales:
+            return
+        if len(canales) == 1:
+            destinatarios = self._canales.get(canales[0], ())
+        else:
+            destinatarios = set().union(*(self._canales.get(canal, ()) for canal in canales))
+        for cliente in destinatarios:
+            cliente.encolar(mensaje)
+
+    async def _enviar(self, cliente: ClienteWs):
+        """Sender task: drain the client's queue until the socket fails or is disconnected"""
+        try:
+            while True:
+                await cliente.pendiente.wait()
+                cliente.pendiente.clear()
+                while cliente.cola:
+                    if cliente.descartados:
+                        # Dropped messages were older than everything still queued
+                        descartados, cliente.descartados = cliente.descartados, 0
+                        await cliente.websocket.send_text(f"⚠️ {descartados} mensajes omitidos (conexión lenta)")
+                    await cliente.websocket.send_text(cliente.cola.popleft())
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await self.desconectar(cliente.websocket)
+
+
+# Shared by every route that reports progress over WebSocket
+ws_manager = ConnectionManager()
@@ -0,0 +1,166 @@
+"""
+Streaming ZIP producer that feeds a resumable Drive upload without touching the disk
+"""
+import os
+import shutil
+import threading
+import zipfile
+from typing import Iterable, Optional, Tuple, Union
+from pathlib import Path
+from googleapiclient.http import MediaUpload
+
+
+# Resumable uploads require chunks that are a multiple of 256 KB
+ZIP_UPLOAD_CHUNK_SIZE = int(os.getenv('ZIP_UPLOAD_CHUNK_SIZE', str(8 * 1024 * 1024)))
+
+
+class _UploadCancelado(Exception):
+    """Raised inside the producer thread when the upload is abandoned"""
+
+
+class _SalidaZip:
+    """Write-only, non-seekable file object handed to zipfile"""
+
+    def __init__(self, media: 'ZipStreamUpload'):
+        self._media = media
+
+    def write(self, data) -> int:
+        self._media._escribir(data)
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+class ZipStreamUpload(MediaUpload):
+    """
+    MediaUpload that builds a ZIP on the fly from (arcname, source) entries, where
+    source is a file path or bytes, and hands it to a resumable upload chunk by chunk.
+
+    A producer thread writes the archive into a buffer capped at three chunks, so
+    memory stays bounded by the chunk size whatever the archive size. Bytes are only
+    dropped once Drive has acknowledged them, which lets googleapiclient resend the
+    current chunk after a transient error.
+
+    With fecha, a (year, month, day, hour, minute, second) tuple, every entry is
+    stamped with it instead of its mtime or the current time, so the same entries
+    always give the same bytes. That makes the archive reproducible: a resumed upload
+    rebuilds it and getbytes() skips the bytes Drive already acknowledged.
+    """
+
+    def __init__(self, entradas: Iterable[Tuple[str, Union[Path, str, bytes]]],
+                 chunksize: int = ZIP_UPLOAD_CHUNK_SIZE, mimetype: str = 'application/zip',
+                 fecha: Optional[Tuple[int, int, int, int, int, int]] = None):
+        super().__init__()
+        self._chunksize = chunksize
+        self._fecha = fecha
+        self._mimetype = mimetype
+        self._max_buffer = 3 * chunksize
+        self._buffer = bytearray()
+        self._inicio = 0
+        self._siguiente = 0
+        self._terminado = False
+        self._cancelado = False
+        self._error = None
+        self._cond = threading.Condition()
+        self._productor = threading.Thread(target=self._producir, args=(entradas,), daemon=True)
+        self._productor.start()
+
+    def chunksize(self) -> int:
+        return self._chunksize
+
+    def mimetype(self) -> str:
+        return self._mimetype
+
+    def resumable(self) -> bool:
+        return True
+
+    def size(self):
+        """
+        Total size once the archive is complete, otherwise None.
+        Waits until there is more than one chunk ahead of the upload (or the archive
+        is finished) so the last chunk is always sent with its final size.
+        """
+        with self._cond:
+            while (not self._terminado and
+                   self._inicio + len(self._buffer) <= self._siguiente + self._chunksize):
+                self._cond.wait()
+            if self._terminado and self._error is None:
+                return self._inicio + len(self._buffer)
+            return None
+
+    def getbytes(self, begin: int, length: int) -> bytes:
+        """Return up to length bytes starting at begin; everything before begin is acknowledged"""
+        with self._cond:
+            if begin < self._inicio:
+                raise ValueError(f"Offset {begin} already released from the ZIP stream")
+            # A resumed session starts past byte 0: produce and drop what Drive already has
+            while self._inicio + len(self._buffer) < begin and not self._terminado:
+                self._inicio += len(self._buffer)
+                self._buffer.clear()
+                self._cond.notify_all()
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+            if self._inicio + len(self._buffer) < begin:
+                raise ValueError(f"Offset {begin} is past the end of the ZIP stream")
+            del self._buffer[:begin - self._inicio]
+            self._inicio = begin
+            self._cond.notify_all()
+
+            fin = begin + length
+            while self._inicio + len(self._buffer) < fin and not self._terminado:
+                self._cond.wait()
+            if self._error is not None:
+                raise self._error
+
+            datos = bytes(self._buffer[:length])
+            self._siguiente = begin + len(datos)
+            return datos
+
+    def has_stream(self) -> bool:
+        return False
+
+    def cancelar(self):
+        """Stop the producer thread if the upload is abandoned"""
+        with self._cond:
+            self._cancelado = True
+            self._cond.notify_all()
+
+    def _escribir(self, data):
+        with self._cond:
+            while len(self._buffer) >= self._max_buffer and not self._cancelado:
+                self._cond.wait()
+            if self._cancelado:
+                raise _UploadCancelado()
+            self._buffer += data
+            self._cond.notify_all()
+
+    def _producir(self, entradas):
+        error = None
+        try:
+            with zipfile.ZipFile(_SalidaZip(self), 'w', zipfile.ZIP_DEFLATED) as zipf:
+                for nombre, origen in entradas:
+                    if self._fecha is None:
+                        if isinstance(origen, (bytes, bytearray)):
+                            zipf.writestr(nombre, origen)
+                        else:
+                            zipf.write(origen, nombre)
+                    elif isinstance(origen, (bytes, bytearray)):
+                        info = zipfile.ZipInfo(nombre, self._fecha)
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        info.external_attr = 0o600 << 16
+                        zipf.writestr(info, origen)
+                    else:
+                        info = zipfile.ZipInfo.from_file(origen, nombre)
+                        info.date_time = self._fecha
+                        info.compress_type = zipfile.ZIP_DEFLATED
+                        with open(origen, 'rb') as fuente, zipf.open(info, 'w') as destino:
+                            shutil.copyfileobj(fuente, destino, 1024 * 1024)
+        except Exception as e:
+            error = e
+        finally:
+            with self._cond:
+                self._error = error
+                self._terminado = True
+                self._cond.notify_all()
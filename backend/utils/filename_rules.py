@@ -0,0 +1,111 @@
+"""
+Reglas de nombres de archivo compiladas una sola vez y compartidas por preview, process y FileProcessor
+"""
+import re
+from typing import Iterable, List, NamedTuple
+
+
+EXTENSIONES_IMAGEN = frozenset({
+    '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff',
+    '.webp', '.raw', '.cr2', '.nef', '.arw', '.dng',
+    '.svg', '.ico', '.jfif'
+})
+ARCHIVOS_SISTEMA = frozenset({'.DS_Store', 'Thumbs.db', 'desktop.ini', '.localized'})
+
+# Estados posibles de un nombre, en el orden en que se comprueban
+OMITIDO = 'omitido'          # archivo de sistema u oculto
+NO_IMAGEN = 'no_imagen'
+FORMATO_PT = 'formato_pt'    # .PT sin exactamente 2 dígitos
+SIN_MARCA = 'sin_marca'      # ni .PT ni .MAIN
+VALIDO = 'valido'
+
+MOTIVOS = {
+    OMITIDO: "Archivo de sistema u oculto",
+    NO_IMAGEN: "No es un archivo de imagen",
+    FORMATO_PT: "Formato .PT incorrecto (debe tener exactamente 2 dígitos, ej: .PT01)",
+    SIN_MARCA: "Debe contener .PT o .MAIN en el nombre",
+    VALIDO: None,
+}
+
+# Una sola pasada encuentra todas las marcas .PT<sufijo> y .MAIN, sin distinguir mayúsculas
+_PATRON_MARCAS = re.compile(r'\.(?:(pt)([^.\s]*)|(main))', re.IGNORECASE)
+
+
+class Veredicto(NamedTuple):
+    """Resultado de clasificar un nombre de archivo"""
+    nombre: str
+    estado: str
+    nombre_normalizado: str  # con .PT y .MAIN en mayúsculas
+    es_png: bool
+
+    @property
+    def valido(self) -> bool:
+        return self.estado == VALIDO
+
+    @property
+    def motivo(self) -> str:
+        return MOTIVOS[self.estado]
+
+
+def extension(nombre_archivo: str) -> str:
+    """Extensión en minúsculas, con la misma semántica que Path.suffix"""
+    punto = nombre_archivo.rfind('.')
+    if 0 < punto < len(nombre_archivo) - 1:
+        return nombre_archivo[punto:].lower()
+    return ''
+
+
+def es_oculto(nombre_archivo: str) -> bool:
+    """Archivos de sistema y ocultos que nunca se procesan"""
+    return nombre_archivo in ARCHIVOS_SISTEMA or nombre_archivo.startswith('.')
+
+
+def formato_pt_valido(nombre_archivo: str) -> bool:
+    """Todas las marcas .PT del nombre llevan exactamente 2 dígitos"""
+    for match in _PATRON_MARCAS.finditer(nombre_archivo):
+        if match.group(1) is not None:
+            sufijo = match.group(2)
+            if not (sufijo.isdigit() and len(sufijo) == 2):
+                return False
+    return True
+
+
+def clasificar(nombre_archivo: str) -> Veredicto:
+    """Clasifica un nombre recorriendo sus marcas una sola vez"""
+    ext = extension(nombre_archivo)
+    es_png = ext == '.png'
+
+    if es_oculto(nombre_archivo):
+        return Veredicto(nombre_archivo, OMITIDO, nombre_archivo, es_png)
+    if ext not in EXTENSIONES_IMAGEN:
+        return Veredicto(nombre_archivo, NO_IMAGEN, nombre_archivo, es_png)
+
+    tiene_marca = False
+    formato_ok = True
+    partes = []
+    ultimo = 0
+    for match in _PATRON_MARCAS.finditer(nombre_archivo):
+        tiene_marca = True
+        if match.group(1) is not None:
+            sufijo = match.group(2)
+            if not (sufijo.isdigit() and len(sufijo) == 2):
+                formato_ok = False
+            inicio, fin = match.span(1)
+        else:
+            inicio, fin = match.span(3)
+        partes.append(nombre_archivo[ultimo:inicio])
+        partes.append(nombre_archivo[inicio:fin].upper())
+        ultimo = fin
+
+    if not tiene_marca:
+        return Veredicto(nombre_archivo, SIN_MARCA, nombre_archivo, es_png)
+
+    partes.append(nombre_archivo[ultimo:])
+    normalizado = ''.join(partes)
+    estado = VALIDO if formato_ok else FORMATO_PT
+    return Veredicto(nombre_archivo, estado, normalizado, es_png)
+
+
+def clasificar_nombres(nombres: Iterable[str]) -> List[Veredicto]:
+    """Clasifica una lista completa de nombres en una pasada"""
+    return [clasificar(nombre) for nombre in nombres]
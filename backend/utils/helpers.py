@@ -2,17 +2,13 @@
 Utility helper functions for the LEBENGOOD application
 """
 from pathlib import Path
-import re
+import hashlib
+from utils.filename_rules import EXTENSIONES_IMAGEN, extension, formato_pt_valido
 
 
 def es_imagen(nombre_archivo: str) -> bool:
     """Verifica si un archivo es una imagen basándose en su extensión"""
-    extensiones_imagen = {
-        '.jpg', '.jpeg', '.png', '.gif', '.bmp', '.tiff', 
-        '.webp', '.raw', '.cr2', '.nef', '.arw', '.dng', 
-        '.svg', '.ico', '.jfif'
-    }
-    return Path(nombre_archivo).suffix.lower() in extensiones_imagen
+    return extension(nombre_archivo) in EXTENSIONES_IMAGEN
 
 
 def extraer_pais_de_ruta(ruta_carpeta: str) -> str:
@@ -75,11 +71,13 @@ def transformar_nombre_carpeta(nombre_carpeta: str) -> str:
 
 def validar_formato_pt(nombre_archivo: str) -> bool:
     """Valida que los archivos .PT tengan exactamente 2 dígitos"""
-    nombre_upper = nombre_archivo.upper()
-    if '.PT' in nombre_upper:
-        matches = re.finditer(r'\.PT([^.\s]*)', nombre_upper)
-        for match in matches:
-            sufijo = match.group(1)
-            if not (sufijo and sufijo.isdigit() and len(sufijo) == 2):
-                return False
-    return True
+    return formato_pt_valido(nombre_archivo)
+
+
+def calcular_md5(ruta_archivo: Path, tamano_bloque: int = 1024 * 1024) -> str:
+    """Calcula el MD5 de un archivo leyéndolo por bloques (mismo formato que md5Checksum de Drive)"""
+    md5 = hashlib.md5()
+    with open(ruta_archivo, 'rb') as archivo:
+        for bloque in iter(lambda: archivo.read(tamano_bloque), b''):
+            md5.update(bloque)
+    return md5.hexdigest()
@@ -53,7 +53,9 @@ function App() {
       // Determine WebSocket protocol (ws or wss) and host
     const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:'
     const host = import.meta.env.PROD ? window.location.host : 'localhost:8000'
-    const wsUrl = `${protocol}//${host}/api/ws`
+    // Authenticate with the JWT so the server only sends this user's own progress
+    const token = encodeURIComponent(localStorage.getItem('token') || '')
+    const wsUrl = `${protocol}//${host}/api/ws?token=${token}`
 
     const ws = new WebSocket(wsUrl)
       
@@ -68,10 +70,11 @@ function App() {
       }
       
       ws.onmessage = (event) => {
-        setLogs(prev => [...prev, {
-          message: event.data,
-          timestamp: new Date().toISOString()
-        }])
+        // The server batches bursts of log lines into one newline-separated frame
+        const timestamp = new Date().toISOString()
+        const lines = event.data.split('\n').filter(line => line.trim())
+        if (lines.length === 0) return
+        setLogs(prev => [...prev, ...lines.map(message => ({ message, timestamp }))])
       }
       
       ws.onclose = () => {
@@ -1,15 +1,13 @@
 import { useState, useEffect } from 'react'
 
 import { FolderPlus, Package, Palette, Plus, List, X, Info, Rocket, Clock, Check, Search } from 'lucide-react'
-
-// In production (Render), API is served from same origin
-// In development (Vite), we need to point to localhost:8000
-const API_URL = import.meta.env.PROD ? '' : 'http://localhost:8000'
+import { useBackgroundJob } from '../hooks/useBackgroundJob'
 
 export default function CreateFolders({ logs, clearLogs, toast, availableCountries = [] }) {
   const [nombreCarpeta, setNombreCarpeta] = useState('')
   const [selectedCountries, setSelectedCountries] = useState([])
   const [processing, setProcessing] = useState(false)
+  const runJob = useBackgroundJob()
   const [searchTerm, setSearchTerm] = useState('')
 
   useEffect(() => {
@@ -75,23 +73,18 @@ export default function CreateFolders({ logs, clearLogs, toast, availableCountri
       formData.append('nombre_carpeta', nombreCarpeta)
       formData.append('paises', selectedCountries.join(','))
       
-      const response = await fetch(`${API_URL}/api/folders/create`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: formData
-      })
-
-      const result = await response.json()
+      // Runs as a background job; progress arrives over the WebSocket log
+      const job = await runJob('/api/folders/create', formData)
+      if (job.cancelled) return
 
-      if (!response.ok) {
-        const errorMsg = result.error?.message || 'Error al crear estructura'
-        const errorCode = result.error?.code || 'UNKNOWN_ERROR'
+      if (!job.ok) {
+        const errorMsg = job.error?.message || 'Error al crear estructura'
+        const errorCode = job.error?.code || 'UNKNOWN_ERROR'
         toast.error(`${errorMsg} (${errorCode})`, 6000)
         return
       }
 
+      const result = job.result
       toast.success(`¡Éxito! ${result.total_carpetas} carpetas creadas en ${result.paises_procesados} países`, 5000)
       
     } catch (error) {
@@ -1,15 +1,13 @@
 import { useState } from 'react'
 
 import { Image, Globe, Folder, Lightbulb, Repeat, Rocket, Clock, Trash2, Info } from 'lucide-react'
-
-// In production (Render), API is served from same origin
-// In development (Vite), we need to point to localhost:8000
-const API_URL = import.meta.env.PROD ? '' : 'http://localhost:8000'
+import { useBackgroundJob } from '../hooks/useBackgroundJob'
 
 export default function GatherPhotos({ logs, clearLogs, toast }) {
   const [pais, setPais] = useState('')
   const [carpeta, setCarpeta] = useState('')
   const [processing, setProcessing] = useState(false)
+  const runJob = useBackgroundJob()
 
   const handleSubmit = async (e) => {
     e.preventDefault()
@@ -35,17 +33,11 @@ export default function GatherPhotos({ logs, clearLogs, toast }) {
       formData.append('pais', pais)
       formData.append('carpeta', carpeta)
       
-      const response = await fetch(`${API_URL}/api/photos/gather`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: formData
-      })
-
-      const result = await response.json()
+      // Runs as a background job; progress arrives over the WebSocket log
+      const result = await runJob('/api/photos/gather', formData)
+      if (result.cancelled) return
 
-      if (!response.ok) {
+      if (!result.ok) {
         const errorMsg = result.error?.message || 'Error al reunir fotos'
         const errorCode = result.error?.code || 'UNKNOWN_ERROR'
         toast.error(`${errorMsg} (${errorCode})`, 6000)
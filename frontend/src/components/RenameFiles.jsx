@@ -1,6 +1,7 @@
 import { useState, useEffect } from 'react'
 
 import { FileEdit, Package, Tag, Folder, FolderPlus, X, Image as ImageIcon, Rocket, Clock, Info, CheckCircle, AlertTriangle, ArrowLeft, Eye, Upload, Grid, Globe, Check, Search, List } from 'lucide-react'
+import { useBackgroundJob } from '../hooks/useBackgroundJob'
 
 // In production (Render), API is served from same origin
 // In development (Vite), we need to point to localhost:8000
@@ -23,6 +24,7 @@ export default function RenameFiles({ logs, clearLogs, toast, availableCountries
   
   // Shared State
   const [processing, setProcessing] = useState(false)
+  const runJob = useBackgroundJob()
   const [previewMode, setPreviewMode] = useState(false)
   const [previewData, setPreviewData] = useState(null)
   const [analyzing, setAnalyzing] = useState(false)
@@ -221,17 +223,11 @@ export default function RenameFiles({ logs, clearLogs, toast, availableCountries
         }
       })
       
-      const response = await fetch(`${API_URL}/api/rename/process`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: formData
-      })
-
-      const result = await response.json()
+      // Runs as a background job; progress arrives over the WebSocket log
+      const result = await runJob('/api/rename/process', formData)
+      if (result.cancelled) return
 
-      if (!response.ok) {
+      if (!result.ok) {
         const errorMsg = result.error?.message || 'Error en el procesamiento'
         toast.error(errorMsg, 6000)
         return
@@ -266,17 +262,11 @@ export default function RenameFiles({ logs, clearLogs, toast, availableCountries
         })
       })
       
-      const response = await fetch(`${API_URL}/api/rename/process`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: formData
-      })
-
-      const result = await response.json()
+      // Runs as a background job; progress arrives over the WebSocket log
+      const result = await runJob('/api/rename/process', formData)
+      if (result.cancelled) return
 
-      if (!response.ok) {
+      if (!result.ok) {
         const errorMsg = result.error?.message || 'Error en el procesamiento'
         toast.error(errorMsg, 6000)
         return
@@ -349,17 +339,11 @@ export default function RenameFiles({ logs, clearLogs, toast, availableCountries
         })
       })
       
-      const response = await fetch(`${API_URL}/api/rename/process`, {
-        method: 'POST',
-        headers: {
-          'Authorization': `Bearer ${localStorage.getItem('token')}`
-        },
-        body: formData
-      })
+      // Runs as a background job; progress arrives over the WebSocket log
+      const result = await runJob('/api/rename/process', formData)
+      if (result.cancelled) return
 
-      const result = await response.json()
-
-      if (!response.ok) {
+      if (!result.ok) {
         const errorMsg = result.error?.message || 'Error en el procesamiento'
         toast.error(errorMsg, 6000)
         return
@@ -0,0 +1,57 @@
+import { useCallback, useEffect, useRef } from 'react'
+
+// In production (Render), API is served from same origin
+const API_URL = import.meta.env.PROD ? '' : 'http://localhost:8000'
+const POLL_INTERVAL_MS = 2000
+
+const wait = (ms) => new Promise(resolve => setTimeout(resolve, ms))
+
+// Submits a long form as a background job and polls GET /api/jobs/{id} until it ends,
+// so no request stays open for the whole batch and runs into the proxy timeout.
+// Resolves to { ok, result } or { ok: false, error: { message, code } }.
+export function useBackgroundJob() {
+  const mounted = useRef(true)
+
+  useEffect(() => {
+    mounted.current = true
+    return () => {
+      mounted.current = false
+    }
+  }, [])
+
+  const runJob = useCallback(async (path, formData) => {
+    const headers = { 'Authorization': `Bearer ${localStorage.getItem('token')}` }
+    formData.append('background', 'true')
+
+    const response = await fetch(`${API_URL}${path}`, { method: 'POST', headers, body: formData })
+    const submitted = await response.json()
+    if (!response.ok) {
+      return { ok: false, error: submitted.error }
+    }
+
+    while (mounted.current) {
+      await wait(POLL_INTERVAL_MS)
+      let job
+      try {
+        const statusResponse = await fetch(`${API_URL}${submitted.status_url}`, { headers })
+        if (statusResponse.status === 404) {
+          return { ok: false, error: { message: 'Trabajo no encontrado', code: 'JOB_NOT_FOUND' } }
+        }
+        if (!statusResponse.ok) continue
+        job = await statusResponse.json()
+      } catch (error) {
+        // The server may be restarting; the job resumes there, so keep polling
+        continue
+      }
+      if (job.status === 'completed') {
+        return { ok: true, result: job.result }
+      }
+      if (job.status === 'failed') {
+        return { ok: false, error: { message: job.error, code: 'JOB_FAILED' } }
+      }
+    }
+    return { ok: false, cancelled: true }
+  }, [])
+
+  return runJob
+}